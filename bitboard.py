@@ -0,0 +1,581 @@
+import numpy as np
+from array import array
+from pieces import Piece, King, Queen, Rook, Bishop, Knight, Pawn0, Pawn1
+from board import BOARD_SIZE, STALEMATE_THRESHOLD, PROMOTION_FLAG, parse_fen
+from zobrist import ZOBRIST_PIECES, ZOBRIST_TURN, halfmove_key
+from encoding import PIECE_CODES, encode_codes
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_NAMES = ("PNBRQK", "pnbrqk")
+# Kings are left out of material totals.
+PIECE_VALUES = (1, 3, 3, 5, 9, 0)
+
+# Ray directions as (rank step, file step). The first four walk towards higher
+# square indices, so their nearest blocker is the lowest set bit.
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+POSITIVE_DIRECTIONS = (0, 1, 2, 3)
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+ALL_DIRECTIONS = tuple(range(8))
+
+
+def square(rank: int, file: int) -> int:
+    return rank * BOARD_SIZE + file
+
+
+def _offset_table(offsets):
+    table = []
+    for sq in range(64):
+        rank, file = divmod(sq, BOARD_SIZE)
+        mask = 0
+        for dr, df in offsets:
+            r, f = rank + dr, file + df
+            if 0 <= r < BOARD_SIZE and 0 <= f < BOARD_SIZE:
+                mask |= 1 << square(r, f)
+        table.append(mask)
+    return table
+
+
+def _ray_table():
+    table = []
+    for dr, df in DIRECTIONS:
+        rays = []
+        for sq in range(64):
+            rank, file = divmod(sq, BOARD_SIZE)
+            mask = 0
+            r, f = rank + dr, file + df
+            while 0 <= r < BOARD_SIZE and 0 <= f < BOARD_SIZE:
+                mask |= 1 << square(r, f)
+                r, f = r + dr, f + df
+            rays.append(mask)
+        table.append(rays)
+    return table
+
+
+KNIGHT_ATTACKS = _offset_table([(-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2)])
+KING_ATTACKS = _offset_table([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+PAWN_ATTACKS = [_offset_table([(1, -1), (1, 1)]), _offset_table([(-1, -1), (-1, 1)])]
+RAYS = _ray_table()
+
+
+def lsb(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+def msb(mask: int) -> int:
+    return mask.bit_length() - 1
+
+
+def popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def iter_bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def slide_attacks(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            blocker = lsb(blockers) if d in POSITIVE_DIRECTIONS else msb(blockers)
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+def mask_to_plane(mask: int) -> np.ndarray:
+    bits = np.unpackbits(np.frombuffer(mask.to_bytes(8, "little"), dtype=np.uint8), bitorder="little")
+    return bits.reshape(BOARD_SIZE, BOARD_SIZE).astype(np.float32)
+
+
+class _BitMoves():
+    # Mixed into the regular piece classes so callers iterating get_pieces()
+    # keep working, while move generation goes through the attack tables.
+    def get_moves(self, board: 'BitBoard'):
+        return board.piece_moves(self.rank, self.file)
+
+
+# Module-level names so boards holding these pieces can be pickled.
+class BitPawn0(_BitMoves, Pawn0):
+    pass
+
+
+class BitPawn1(_BitMoves, Pawn1):
+    pass
+
+
+class BitKnight(_BitMoves, Knight):
+    pass
+
+
+class BitBishop(_BitMoves, Bishop):
+    pass
+
+
+class BitRook(_BitMoves, Rook):
+    pass
+
+
+class BitQueen(_BitMoves, Queen):
+    pass
+
+
+class BitKing(_BitMoves, King):
+    pass
+
+
+_BIT_CLASSES = [(BitPawn0, BitPawn1), (BitKnight, BitKnight), (BitBishop, BitBishop), (BitRook, BitRook),
+                (BitQueen, BitQueen), (BitKing, BitKing)]
+_CLASS_TO_TYPE = {Pawn0: PAWN, Pawn1: PAWN, Knight: KNIGHT, Bishop: BISHOP, Rook: ROOK, Queen: QUEEN, King: KING}
+
+
+class BitBoard():
+    def __init__(self, placement=None):
+        self._turn = 0
+        self.halfmove_clock = 0
+        self.fullmove_number = 0
+        self.stalemate_threshold = 20
+        self.history = []
+        self.initialize(placement)
+        self.hash = self.compute_hash()
+        self.material = self.compute_material()
+        self._check_cache = None
+
+    def initialize(self, placement=None):
+        if placement is None:
+            placement = {
+                'K': (King, [(0, 4, 0), (7, 4, 1)]),
+                'Q': (Queen, [(0, 3, 0), (7, 3, 1)]),
+                'R': (Rook, [(0, 0, 0), (0, 7, 0), (7, 0, 1), (7, 7, 1)]),
+                'B': (Bishop, [(0, 2, 0), (0, 5, 0), (7, 2, 1), (7, 5, 1)]),
+                'N': (Knight, [(0, 1, 0), (0, 6, 0), (7, 1, 1), (7, 6, 1)]),
+                'P': (Pawn0, [(1, i, 0) for i in range(BOARD_SIZE)]),
+                'p': (Pawn1, [(6, i, 1) for i in range(BOARD_SIZE)])
+            }
+
+        self.bitboards = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+        for cls, positions in placement.values():
+            piece_type = _CLASS_TO_TYPE[cls]
+            for rank, file, player in positions:
+                bit = 1 << square(rank, file)
+                self.bitboards[player][piece_type] |= bit
+                self.occupancy[player] |= bit
+        self._pieces = [None, None]
+
+    @classmethod
+    def from_codes(cls, codes, turn: int = 0, halfmove_clock: int = 0, fullmove_number: int = 0) -> 'BitBoard':
+        board = cls.__new__(cls)
+        board._turn = turn
+        board.halfmove_clock = halfmove_clock
+        board.fullmove_number = fullmove_number
+        board.stalemate_threshold = 20
+        board.history = []
+        board.bitboards = [[0] * 6, [0] * 6]
+        board.occupancy = [0, 0]
+        codes = np.asarray(codes, dtype=np.int8).reshape(64)
+        for sq in np.flatnonzero(codes).tolist():
+            code = int(codes[sq])
+            player = 0 if code > 0 else 1
+            board.bitboards[player][abs(code) - 1] |= 1 << sq
+            board.occupancy[player] |= 1 << sq
+        board._pieces = [None, None]
+        board.hash = board.compute_hash()
+        board.material = board.compute_material()
+        board._check_cache = None
+        return board
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'BitBoard':
+        return cls.from_codes(*parse_fen(fen))
+
+    @property
+    def turn(self) -> int:
+        return self._turn
+
+    @turn.setter
+    def turn(self, player: int):
+        if player != self._turn:
+            self.hash ^= ZOBRIST_TURN
+            self._turn = player
+
+    def compute_hash(self) -> int:
+        key = halfmove_key(self.halfmove_clock)
+        if self._turn:
+            key ^= ZOBRIST_TURN
+        for player in (0, 1):
+            for piece_type, mask in enumerate(self.bitboards[player]):
+                keys = ZOBRIST_PIECES[PIECE_NAMES[player][piece_type]]
+                for sq in iter_bits(mask):
+                    key ^= keys[sq]
+        return key
+
+    @property
+    def occupied(self) -> int:
+        return self.occupancy[0] | self.occupancy[1]
+
+    def copy(self) -> 'BitBoard':
+        board = BitBoard.__new__(type(self))
+        board._turn = self._turn
+        board.hash = self.hash
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.stalemate_threshold = self.stalemate_threshold
+        board.bitboards = [self.bitboards[0][:], self.bitboards[1][:]]
+        board.occupancy = self.occupancy[:]
+        board.material = self.material[:]
+        board._pieces = [None, None]
+        board._check_cache = self._check_cache
+        board.history = []
+        return board
+
+    def piece_at(self, sq: int):
+        bit = 1 << sq
+        for player in (0, 1):
+            if self.occupancy[player] & bit:
+                for piece_type, mask in enumerate(self.bitboards[player]):
+                    if mask & bit:
+                        return player, piece_type
+        return None
+
+    def is_occupied(self, rank: int, file: int) -> bool:
+        return bool(self.occupied >> square(rank, file) & 1)
+
+    def is_occupied_by(self, rank: int, file: int, player: int) -> bool:
+        return bool(self.occupancy[player] >> square(rank, file) & 1)
+
+    def attacks_from(self, sq: int, player: int, piece_type: int) -> int:
+        if piece_type == PAWN:
+            return PAWN_ATTACKS[player][sq]
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if piece_type == KING:
+            return KING_ATTACKS[sq]
+        occupied = self.occupied
+        if piece_type == BISHOP:
+            return slide_attacks(sq, occupied, BISHOP_DIRECTIONS)
+        if piece_type == ROOK:
+            return slide_attacks(sq, occupied, ROOK_DIRECTIONS)
+        return slide_attacks(sq, occupied, ALL_DIRECTIONS)
+
+    def targets(self, sq: int, player: int, piece_type: int) -> int:
+        if piece_type != PAWN:
+            return self.attacks_from(sq, player, piece_type) & ~self.occupancy[player]
+
+        rank = sq >> 3
+        if rank == (7 if player == 0 else 0):
+            return 0
+        step = 8 if player == 0 else -8
+        empty = ~self.occupied
+        moves = PAWN_ATTACKS[player][sq] & self.occupancy[1 - player]
+        one = 1 << (sq + step)
+        if one & empty:
+            moves |= one
+            if rank == (1 if player == 0 else 6):
+                two = 1 << (sq + 2 * step)
+                if two & empty:
+                    moves |= two
+        return moves
+
+    def piece_moves(self, rank: int, file: int):
+        sq = square(rank, file)
+        found = self.piece_at(sq)
+        if found is None:
+            return []
+        return [divmod(to, BOARD_SIZE) for to in iter_bits(self.targets(sq, *found))]
+
+    def is_square_attacked(self, rank: int, file: int, by_player: int) -> bool:
+        return self.square_attacked(square(rank, file), by_player)
+
+    def square_attacked(self, sq: int, by_player: int, occupied: int = None) -> bool:
+        own = self.bitboards[by_player]
+        if KNIGHT_ATTACKS[sq] & own[KNIGHT] or KING_ATTACKS[sq] & own[KING]:
+            return True
+        # A pawn of by_player attacks sq exactly when a pawn of the other side
+        # standing on sq would attack the pawn's square.
+        if PAWN_ATTACKS[1 - by_player][sq] & own[PAWN]:
+            return True
+        if occupied is None:
+            occupied = self.occupied
+        diagonal = own[BISHOP] | own[QUEEN]
+        if diagonal and slide_attacks(sq, occupied, BISHOP_DIRECTIONS) & diagonal:
+            return True
+        straight = own[ROOK] | own[QUEEN]
+        return bool(straight and slide_attacks(sq, occupied, ROOK_DIRECTIONS) & straight)
+
+    def get_pieces(self, player: int):
+        if self._pieces[player] is None:
+            pieces = []
+            for piece_type, mask in enumerate(self.bitboards[player]):
+                cls = _BIT_CLASSES[piece_type][player]
+                for sq in iter_bits(mask):
+                    rank, file = divmod(sq, BOARD_SIZE)
+                    pieces.append(cls(rank, file, player))
+            self._pieces[player] = pieces
+        return self._pieces[player]
+
+    @property
+    def player0_pieces(self):
+        return self.get_pieces(0)
+
+    @property
+    def player1_pieces(self):
+        return self.get_pieces(1)
+
+    @property
+    def grid(self):
+        grid = np.empty([BOARD_SIZE, BOARD_SIZE], dtype=Piece)
+        for piece in self.get_pieces(0) + self.get_pieces(1):
+            grid[piece.rank, piece.file] = piece
+        return grid
+
+    def king_square(self, player: int) -> int:
+        return lsb(self.bitboards[player][KING])
+
+    def is_legal(self, ignore_halfmove=False, verbose=False) -> bool:
+        in_check = self.square_attacked(self.king_square(1 - self.turn), self.turn)
+        if verbose and in_check:
+            print("Player %d can capture the king this turn"%self.turn)
+        if verbose and self.halfmove_clock >= STALEMATE_THRESHOLD:
+            print("Halfmove clock exceeded")
+        return not in_check and (ignore_halfmove or self.halfmove_clock < STALEMATE_THRESHOLD)
+
+    def move(self, rank_initial, file_initial, rank_final, file_final):
+        board = self.copy()
+        board.make_move(rank_initial, file_initial, rank_final, file_final)
+        return board
+
+    def make_move(self, rank_initial, file_initial, rank_final, file_final):
+        if rank_initial == rank_final and file_initial == file_final:
+            self.history.append(None)
+            return
+
+        start, end = square(rank_initial, file_initial), square(rank_final, file_final)
+        player, piece_type = self.piece_at(start)
+        captured = self.piece_at(end)
+        promoted = piece_type == PAWN and rank_final == (7 if player == 0 else 0)
+        self.history.append((start, end, player, piece_type, captured, promoted, self.halfmove_clock, self.fullmove_number, self.hash))
+        start_bit, end_bit = 1 << start, 1 << end
+        names = PIECE_NAMES[player]
+        key = self.hash ^ halfmove_key(self.halfmove_clock) ^ ZOBRIST_PIECES[names[piece_type]][start] ^ ZOBRIST_TURN
+
+        if captured is not None:
+            self.halfmove_clock = 0
+            self.bitboards[captured[0]][captured[1]] &= ~end_bit
+            self.occupancy[captured[0]] &= ~end_bit
+            self.material[captured[0]] -= PIECE_VALUES[captured[1]]
+            key ^= ZOBRIST_PIECES[PIECE_NAMES[captured[0]][captured[1]]][end]
+        else:
+            self.halfmove_clock += 1
+        if player:
+            self.fullmove_number += 1
+        if promoted:
+            self.halfmove_clock = 0
+            self.material[player] += PIECE_VALUES[QUEEN] - PIECE_VALUES[PAWN]
+
+        self.bitboards[player][piece_type] &= ~start_bit
+        self.bitboards[player][QUEEN if promoted else piece_type] |= end_bit
+        self.occupancy[player] = (self.occupancy[player] & ~start_bit) | end_bit
+
+        self._turn = 1 - self._turn
+        self.hash = key ^ halfmove_key(self.halfmove_clock) ^ ZOBRIST_PIECES[names[QUEEN if promoted else piece_type]][end]
+        self._pieces = [None, None]
+
+    def unmake_move(self):
+        record = self.history.pop()
+        if record is None:
+            return
+
+        start, end, player, piece_type, captured, promoted, self.halfmove_clock, self.fullmove_number, self.hash = record
+        start_bit, end_bit = 1 << start, 1 << end
+        self.bitboards[player][QUEEN if promoted else piece_type] &= ~end_bit
+        self.bitboards[player][piece_type] |= start_bit
+        self.occupancy[player] = (self.occupancy[player] & ~end_bit) | start_bit
+        if captured is not None:
+            self.bitboards[captured[0]][captured[1]] |= end_bit
+            self.occupancy[captured[0]] |= end_bit
+            self.material[captured[0]] += PIECE_VALUES[captured[1]]
+        if promoted:
+            self.material[player] -= PIECE_VALUES[QUEEN] - PIECE_VALUES[PAWN]
+
+        self._turn = 1 - self._turn
+        self._pieces = [None, None]
+
+    def check_info(self):
+        # Checker count, the mask of squares that resolve a single check (None
+        # when not in check) and pinned squares mapped to the ray they may
+        # still move along, for the side to move. Cached per position.
+        if self._check_cache is not None and self._check_cache[0] == self.hash:
+            return self._check_cache[1]
+
+        player = self.turn
+        enemy = self.bitboards[1 - player]
+        king = self.king_square(player)
+        occupied = self.occupied
+        checkers = KNIGHT_ATTACKS[king] & enemy[KNIGHT] | PAWN_ATTACKS[player][king] & enemy[PAWN]
+        block = checkers
+        pins = {}
+        for d in ALL_DIRECTIONS:
+            sliders = enemy[QUEEN] | (enemy[ROOK] if d in ROOK_DIRECTIONS else enemy[BISHOP])
+            ray = RAYS[d][king]
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            nearest = lsb if d in POSITIVE_DIRECTIONS else msb
+            first = nearest(blockers)
+            if sliders >> first & 1:
+                checkers |= 1 << first
+                block |= ray ^ RAYS[d][first]
+            elif self.occupancy[player] >> first & 1:
+                rest = blockers & ~(1 << first)
+                if rest:
+                    second = nearest(rest)
+                    if sliders >> second & 1:
+                        pins[first] = ray ^ RAYS[d][second]
+
+        count = bin(checkers).count("1")
+        info = (count, block if count else None, pins)
+        self._check_cache = (self.hash, info)
+        return info
+
+    def _legal_targets(self, ignore_halfmove=False):
+        checkers, block, pins = self.check_info()
+        player = self.turn
+        enemy = 1 - player
+        quiet_allowed = ignore_halfmove or self.halfmove_clock + 1 < STALEMATE_THRESHOLD
+        promotion_rank = 0 if player else 7
+        enemy_occupancy = self.occupancy[enemy]
+        for piece_type, mask in enumerate(tuple(self.bitboards[player])):
+            if checkers > 1 and piece_type != KING:
+                continue
+            for start in iter_bits(mask):
+                targets = self.targets(start, player, piece_type)
+                if piece_type == KING:
+                    occupied = self.occupied & ~(1 << start)
+                    targets = sum(1 << end for end in iter_bits(targets)
+                                  if not self.square_attacked(end, enemy, occupied))
+                else:
+                    if block is not None:
+                        targets &= block
+                    if start in pins:
+                        targets &= pins[start]
+                if not quiet_allowed:
+                    allowed = enemy_occupancy
+                    if piece_type == PAWN:
+                        allowed |= 0xFF << (8 * promotion_rank)
+                    targets &= allowed
+                if targets:
+                    yield start, piece_type, targets
+
+    def iter_legal_moves(self, ignore_halfmove=False):
+        promotion_mask = 0xFF << (0 if self.turn else 56)
+        for start, piece_type, targets in self._legal_targets(ignore_halfmove):
+            promotions = targets & promotion_mask if piece_type == PAWN else 0
+            for end in iter_bits(targets):
+                move = start | end << 6
+                if promotions >> end & 1:
+                    move |= PROMOTION_FLAG
+                yield move
+
+    def legal_moves(self, ignore_halfmove=False) -> array:
+        return array('H', self.iter_legal_moves(ignore_halfmove))
+
+    def count_legal_moves(self, ignore_halfmove=False) -> int:
+        return sum(popcount(targets) for _, _, targets in self._legal_targets(ignore_halfmove))
+
+    def compute_material(self) -> list:
+        return [sum(PIECE_VALUES[piece_type] * popcount(mask) for piece_type, mask in enumerate(self.bitboards[player]))
+                for player in (0, 1)]
+
+    def mobility(self, player: int) -> int:
+        # Pseudo-legal move count, the same as Board.mobility.
+        count = 0
+        for piece_type, mask in enumerate(self.bitboards[player]):
+            for sq in iter_bits(mask):
+                count += popcount(self.targets(sq, player, piece_type))
+        return count
+
+    def in_check(self) -> bool:
+        return self.square_attacked(self.king_square(self.turn), 1 - self.turn)
+
+    def has_legal_move(self, ignore_halfmove=False) -> bool:
+        return next(self._legal_targets(ignore_halfmove), None) is not None
+
+    def is_checkmate(self) -> bool:
+        return self.in_check() and not self.has_legal_move(ignore_halfmove=True)
+
+    def is_stalemate(self) -> bool:
+        return not self.has_legal_move()
+
+    def get_display(self) -> str:
+        def piece_to_symbol(sq):
+            found = self.piece_at(sq)
+            return PIECE_NAMES[found[0]][found[1]] if found else " "
+
+        board_lines = []
+        for rank in reversed(range(BOARD_SIZE)):
+            row = " " + " │ ".join(piece_to_symbol(square(rank, file)) for file in range(BOARD_SIZE))
+            board_lines.append(row)
+        return "\n───┼───┼───┼───┼───┼───┼───┼───\n".join(board_lines)
+
+    def get_fen(self) -> str:
+        def row_fen(rank: int) -> str:
+            fen = ""
+            counter = 0
+            for file in range(BOARD_SIZE):
+                found = self.piece_at(square(rank, file))
+                if found is None:
+                    counter += 1
+                else:
+                    if counter > 0:
+                        fen += str(counter)
+                        counter = 0
+                    fen += PIECE_NAMES[found[0]][found[1]]
+            if counter > 0:
+                fen += str(counter)
+            return fen
+
+        return "/".join(
+            [row_fen(i) for i in reversed(range(8))]
+        ) + " " + ("b" if self.turn else "w") + " - - " + str(self.halfmove_clock) + " " + str(self.fullmove_number)
+
+    def __str__(self):
+        return self.get_display()
+
+    def get_placement_dictionary(self):
+        keys = ['P', 'N', 'B', 'R', 'Q', 'K']
+        names = ['Pawn0', 'Knight', 'Bishop', 'Rook', 'Queen', 'King']
+        pd = {key: (name, []) for key, name in zip(keys, names)}
+        pd['p'] = ('Pawn1', [])
+        for player in (0, 1):
+            for piece_type, mask in enumerate(self.bitboards[player]):
+                key = 'p' if piece_type == PAWN and player else keys[piece_type]
+                for sq in iter_bits(mask):
+                    pd[key][1].append((*divmod(sq, BOARD_SIZE), player))
+        return pd
+
+    def get_piece_codes(self) -> np.ndarray:
+        codes = np.zeros(64, dtype=np.int8)
+        for player in (0, 1):
+            for piece_type, mask in enumerate(self.bitboards[player]):
+                if mask:
+                    codes[mask_to_plane(mask).reshape(64) > 0] = PIECE_CODES[PIECE_NAMES[player][piece_type]]
+        return codes.reshape(BOARD_SIZE, BOARD_SIZE)
+
+    def get_board_tensor(self):
+        return encode_codes(self.get_piece_codes(), self.halfmove_clock, self.stalemate_threshold)[0]
+
+
+class EndBitBoard(BitBoard):
+    def initialize(self, placement=None):
+        super().initialize({
+            'K': (King, [(0, 1, 0), (6, 6, 1)]),
+            'Q': (Queen, [(1, 5, 1)]),
+            'R': (Rook, [(1, 6, 1)]),
+        })
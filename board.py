@@ -1,18 +1,99 @@
-import copy
 import numpy as np
+from array import array
 from pieces import Piece, King, Queen, Rook, Bishop, Knight, Pawn0, Pawn1
+from zobrist import ZOBRIST_TURN, piece_key, halfmove_key
+from encoding import PIECE_CODES, encode_codes
 
 BOARD_SIZE = 8
 STALEMATE_THRESHOLD = 20
 
+# Moves pack into 13 bits: from-square, to-square << 6 and a promotion flag.
+PROMOTION_FLAG = 1 << 12
+
+def encode_move(rank_initial: int, file_initial: int, rank_final: int, file_final: int, promotion: bool = False) -> int:
+    move = (rank_initial * BOARD_SIZE + file_initial) | (rank_final * BOARD_SIZE + file_final) << 6
+    return move | PROMOTION_FLAG if promotion else move
+
+def decode_move(move: int):
+    rank_initial, file_initial = divmod(move & 63, BOARD_SIZE)
+    rank_final, file_final = divmod(move >> 6 & 63, BOARD_SIZE)
+    return rank_initial, file_initial, rank_final, file_final
+
+def _on_board(rank: int, file: int) -> bool:
+    return 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE
+
+def _offset_squares(rank: int, file: int, offsets):
+    return [(rank + dr, file + df) for dr, df in offsets if _on_board(rank + dr, file + df)]
+
+def _ray_squares(rank: int, file: int, dr: int, df: int):
+    ray = []
+    rank, file = rank + dr, file + df
+    while _on_board(rank, file):
+        ray.append((rank, file))
+        rank, file = rank + dr, file + df
+    return ray
+
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+# Rays are ordered straight first, then diagonal; each entry records which
+# slider names can attack along it.
+RAY_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+RAY_SLIDERS = ["RrQq"] * 4 + ["BbQq"] * 4
+
+KNIGHT_SQUARES = [[_offset_squares(r, f, KNIGHT_OFFSETS) for f in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+KING_SQUARES = [[_offset_squares(r, f, KING_OFFSETS) for f in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+RAYS = [[[_ray_squares(r, f, dr, df) for dr, df in RAY_DIRECTIONS] for f in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+
+PIECE_CLASSES = {'K': King, 'Q': Queen, 'R': Rook, 'B': Bishop, 'N': Knight, 'P': Pawn0, 'p': Pawn1}
+# Same type order as the default placement dictionary.
+PIECE_ORDER = "KQRBNP"
+
+_fen_rows = {}
+
+def _parse_fen_row(row: str, fen: str):
+    codes = _fen_rows.get(row)
+    if codes is None:
+        codes = []
+        for char in row:
+            if char.isdigit():
+                codes.extend([0] * int(char))
+            elif char in PIECE_CODES:
+                codes.append(PIECE_CODES[char])
+            else:
+                raise ValueError("Invalid FEN piece %r in %r" % (char, fen))
+        if len(codes) != BOARD_SIZE:
+            raise ValueError("Invalid FEN row %r" % row)
+        codes = tuple(codes)
+        if len(_fen_rows) < 4096:
+            _fen_rows[row] = codes
+    return codes
+
+def parse_fen(fen: str):
+    fields = fen.split()
+    if not fields:
+        raise ValueError("Empty FEN %r" % fen)
+    rows = fields[0].split("/")
+    if len(rows) != BOARD_SIZE:
+        raise ValueError("Invalid FEN placement %r" % fields[0])
+    codes = np.array([_parse_fen_row(row, fen) for row in reversed(rows)], dtype=np.int8)
+    turn = 1 if len(fields) > 1 and fields[1] == "b" else 0
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 0
+    return codes, turn, halfmove_clock, fullmove_number
+
 class Board():
     def __init__(self, placement=None):
         self.grid = np.empty([BOARD_SIZE, BOARD_SIZE], dtype=Piece)
-        self.turn = 0
+        self._turn = 0
         self.halfmove_clock = 0
         self.fullmove_number = 0
         self.stalemate_threshold = 20
+        self.history = []
         self.initialize(placement)
+        self.hash = self.compute_hash()
+        self.piece_codes = self.compute_piece_codes()
+        self.material = self.compute_material()
+        self._check_cache = None
 
     def initialize(self, placement=None):
         if placement is None:
@@ -41,6 +122,75 @@ class Board():
                     else:
                         self.King1 = self.grid[rank, file]
 
+    @classmethod
+    def from_codes(cls, codes, turn: int = 0, halfmove_clock: int = 0, fullmove_number: int = 0) -> 'Board':
+        board = cls.__new__(cls)
+        board.grid = np.empty([BOARD_SIZE, BOARD_SIZE], dtype=Piece)
+        board._turn = turn
+        board.halfmove_clock = halfmove_clock
+        board.fullmove_number = fullmove_number
+        board.stalemate_threshold = 20
+        board.history = []
+        board.player0_pieces = []
+        board.player1_pieces = []
+        board.piece_codes = np.array(codes, dtype=np.int8).reshape(BOARD_SIZE, BOARD_SIZE)
+        squares = {}
+        for sq, code in enumerate(board.piece_codes.ravel().tolist()):
+            if code:
+                squares.setdefault(code, []).append(sq)
+        for name in PIECE_ORDER:
+            for player, piece_name in enumerate((name, name.lower())):
+                piece_cls = PIECE_CLASSES.get(piece_name, PIECE_CLASSES[name])
+                pieces = board.get_pieces(player)
+                for sq in squares.get(PIECE_CODES[piece_name], ()):
+                    rank, file = divmod(sq, BOARD_SIZE)
+                    piece = piece_cls(rank, file, player)
+                    board.grid[rank, file] = piece
+                    pieces.append(piece)
+                    if name == 'K':
+                        setattr(board, "King%d" % player, piece)
+        board.hash = board.compute_hash()
+        board.material = board.compute_material()
+        board._check_cache = None
+        return board
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Board':
+        return cls.from_codes(*parse_fen(fen))
+
+    @property
+    def turn(self) -> int:
+        return self._turn
+
+    @turn.setter
+    def turn(self, player: int):
+        if player != self._turn:
+            self.hash ^= ZOBRIST_TURN
+            self._turn = player
+
+    def compute_hash(self) -> int:
+        # Zobrist key over placement, side to move and halfmove clock. The
+        # fullmove number is deliberately left out.
+        key = halfmove_key(self.halfmove_clock)
+        if self._turn:
+            key ^= ZOBRIST_TURN
+        for piece in self.player0_pieces + self.player1_pieces:
+            key ^= piece_key(piece.name, piece.rank, piece.file)
+        return key
+
+    def compute_piece_codes(self) -> np.ndarray:
+        codes = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=np.int8)
+        for piece in self.player0_pieces + self.player1_pieces:
+            codes[piece.rank, piece.file] = PIECE_CODES[piece.name]
+        return codes
+
+    def compute_material(self) -> list:
+        # Non-king piece values per player, kept up to date by make/unmake_move.
+        return [sum(piece.value for piece in self.get_pieces(player) if piece.name not in "Kk") for player in (0, 1)]
+
+    def get_piece_codes(self) -> np.ndarray:
+        return self.piece_codes
+
     def is_occupied(self, rank: int, file: int) -> bool:
         return self.grid[rank, file] is not None
     
@@ -52,79 +202,286 @@ class Board():
     def get_pieces(self, player: int):
         return self.player1_pieces if player else self.player0_pieces
     
+    def is_square_attacked(self, rank: int, file: int, by_player: int, ignore=None) -> bool:
+        # ignore names a square to treat as empty, e.g. a king's own square
+        # when testing where it can move.
+        grid = self.grid
+        for r, f in KNIGHT_SQUARES[rank][file]:
+            piece = grid[r, f]
+            if piece is not None and piece.player == by_player and piece.name in "Nn":
+                return True
+        for r, f in KING_SQUARES[rank][file]:
+            piece = grid[r, f]
+            if piece is not None and piece.player == by_player and piece.name in "Kk":
+                return True
+        pawn_rank = rank - 1 if by_player == 0 else rank + 1
+        if 0 <= pawn_rank < BOARD_SIZE:
+            for f in (file - 1, file + 1):
+                if 0 <= f < BOARD_SIZE:
+                    piece = grid[pawn_rank, f]
+                    if piece is not None and piece.player == by_player and piece.name in "Pp":
+                        return True
+        for ray, sliders in zip(RAYS[rank][file], RAY_SLIDERS):
+            for r, f in ray:
+                piece = grid[r, f]
+                if piece is None or (r, f) == ignore:
+                    continue
+                if piece.player == by_player and piece.name in sliders:
+                    return True
+                break
+        return False
+
+    def check_info(self):
+        # Checkers, the squares that resolve a single check (None when not in
+        # check) and pinned pieces mapped to the squares they may still move to,
+        # all for the side to move. Cached until the position changes.
+        if self._check_cache is not None and self._check_cache[0] == self.hash:
+            return self._check_cache[1]
+
+        player = self.turn
+        enemy = 1 - player
+        king = self.King1 if player else self.King0
+        grid = self.grid
+        checkers = 0
+        block = set()
+        pins = {}
+        for r, f in KNIGHT_SQUARES[king.rank][king.file]:
+            piece = grid[r, f]
+            if piece is not None and piece.player == enemy and piece.name in "Nn":
+                checkers += 1
+                block.add((r, f))
+        pawn_rank = king.rank + 1 if player == 0 else king.rank - 1
+        if 0 <= pawn_rank < BOARD_SIZE:
+            for f in (king.file - 1, king.file + 1):
+                if 0 <= f < BOARD_SIZE:
+                    piece = grid[pawn_rank, f]
+                    if piece is not None and piece.player == enemy and piece.name in "Pp":
+                        checkers += 1
+                        block.add((pawn_rank, f))
+        for ray, sliders in zip(RAYS[king.rank][king.file], RAY_SLIDERS):
+            shield = None
+            for i, (r, f) in enumerate(ray):
+                piece = grid[r, f]
+                if piece is None:
+                    continue
+                if piece.player == player:
+                    if shield is not None:
+                        break
+                    shield = (r, f)
+                    continue
+                if piece.name in sliders:
+                    if shield is None:
+                        checkers += 1
+                        block.update(ray[:i + 1])
+                    else:
+                        pins[shield] = set(ray[:i + 1])
+                break
+
+        info = (checkers, block if checkers else None, pins)
+        self._check_cache = (self.hash, info)
+        return info
+
+    def _legal_targets(self, ignore_halfmove=False):
+        checkers, block, pins = self.check_info()
+        player = self.turn
+        king = self.King1 if player else self.King0
+        promotion_rank = 0 if player else 7
+        quiet_allowed = ignore_halfmove or self.halfmove_clock + 1 < STALEMATE_THRESHOLD
+        grid = self.grid
+        # Iterate over a snapshot so callers can make and unmake moves between yields.
+        for piece in tuple(self.get_pieces(player)):
+            if checkers > 1 and piece is not king:
+                continue
+            origin = (piece.rank, piece.file)
+            pin = pins.get(origin)
+            is_pawn = piece.name in "Pp"
+            targets = []
+            for target in piece.possible_moves(self):
+                if not quiet_allowed and grid[target] is None and not (is_pawn and target[0] == promotion_rank):
+                    continue
+                if piece is king:
+                    if self.is_square_attacked(target[0], target[1], 1 - player, ignore=origin):
+                        continue
+                elif (block is not None and target not in block) or (pin is not None and target not in pin):
+                    continue
+                targets.append(target)
+            if targets:
+                yield piece, targets
+
+    def iter_legal_moves(self, ignore_halfmove=False):
+        promotion_rank = 0 if self.turn else 7
+        for piece, targets in self._legal_targets(ignore_halfmove):
+            origin = piece.rank * BOARD_SIZE + piece.file
+            is_pawn = piece.name in "Pp"
+            for rank, file in targets:
+                move = origin | (rank * BOARD_SIZE + file) << 6
+                if is_pawn and rank == promotion_rank:
+                    move |= PROMOTION_FLAG
+                yield move
+
+    def legal_moves(self, ignore_halfmove=False) -> array:
+        return array('H', self.iter_legal_moves(ignore_halfmove))
+
+    def count_legal_moves(self, ignore_halfmove=False) -> int:
+        return sum(len(targets) for _, targets in self._legal_targets(ignore_halfmove))
+
     def is_legal(self, ignore_halfmove=False, verbose=False) -> bool:
         king = self.King0 if self.turn else self.King1
-        enemy_pieces = self.get_pieces(self.turn)
-        in_check = any(piece.can_capture(king.rank, king.file, self) for piece in enemy_pieces)
+        in_check = self.is_square_attacked(king.rank, king.file, self.turn)
         if verbose and in_check:
             print("Player %d can capture the king this turn"%self.turn)
         if verbose and self.halfmove_clock >= STALEMATE_THRESHOLD:
             print("Halfmove clock exceeded")
         return not in_check and (ignore_halfmove or self.halfmove_clock < STALEMATE_THRESHOLD)
     
+    def copy(self) -> 'Board':
+        board = self.__class__.__new__(self.__class__)
+        board.__dict__.update(self.__dict__)
+        board.grid = np.empty([BOARD_SIZE, BOARD_SIZE], dtype=Piece)
+        board.piece_codes = self.piece_codes.copy()
+        board.material = self.material[:]
+        board.player0_pieces = [piece.copy() for piece in self.player0_pieces]
+        board.player1_pieces = [piece.copy() for piece in self.player1_pieces]
+        for piece in board.player0_pieces + board.player1_pieces:
+            board.grid[piece.rank, piece.file] = piece
+        board.King0 = board.grid[self.King0.rank, self.King0.file]
+        board.King1 = board.grid[self.King1.rank, self.King1.file]
+        board.history = []
+        return board
+
     def move(self, rank_initial, file_initial, rank_final, file_final):
-        board = copy.deepcopy(self)
+        board = self.copy()
+        board.make_move(rank_initial, file_initial, rank_final, file_final)
+        return board
 
+    def make_move(self, rank_initial, file_initial, rank_final, file_final):
         if rank_initial == rank_final and file_initial == file_final:
-            return board
+            self.history.append(None)
+            return
 
-        piece = board.grid[rank_initial, file_initial]
-        if (board.grid[rank_final, file_final] is not None):
-            board.halfmove_clock = 0
-            if board.grid[rank_final, file_final].player == 0:
-                board.player0_pieces.remove(board.grid[rank_final, file_final])
-            else:
-                board.player1_pieces.remove(board.grid[rank_final, file_final])
+        piece = self.grid[rank_initial, file_initial]
+        captured = self.grid[rank_final, file_final]
+        # Piece list positions are restored on unmake so move ordering stays stable.
+        captured_index = None
+        promoted_index = None
+        record = (piece, rank_initial, file_initial, rank_final, file_final, self.halfmove_clock, self.fullmove_number, self.hash)
+        key = self.hash ^ halfmove_key(self.halfmove_clock) ^ piece_key(piece.name, rank_initial, file_initial) ^ ZOBRIST_TURN
+
+        if captured is not None:
+            self.halfmove_clock = 0
+            opp_pieces = self.get_pieces(captured.player)
+            captured_index = opp_pieces.index(captured)
+            del opp_pieces[captured_index]
+            key ^= piece_key(captured.name, rank_final, file_final)
+            if captured is not self.King0 and captured is not self.King1:
+                self.material[captured.player] -= captured.value
         else:
-            board.halfmove_clock += 1
+            self.halfmove_clock += 1
         if piece.player:
-            board.fullmove_number += 1
-
-        if piece.name == 'P' and rank_final == 7:
-            board.player0_pieces.remove(piece)
-            board.grid[rank_final,file_final] = Queen(rank_final,file_final,0)
-            board.player0_pieces.append(board.grid[rank_final,file_final])
-            board.halfmove_clock = 0
-        elif piece.name == 'p' and rank_final == 0:
-            board.player1_pieces.remove(piece)
-            board.grid[rank_final,file_final] = Queen(rank_final,file_final,1)
-            board.player1_pieces.append(board.grid[rank_final,file_final])
-            board.halfmove_clock = 0
+            self.fullmove_number += 1
+
+        if (piece.name == 'P' and rank_final == 7) or (piece.name == 'p' and rank_final == 0):
+            pieces = self.get_pieces(piece.player)
+            promoted_index = pieces.index(piece)
+            del pieces[promoted_index]
+            self.grid[rank_final, file_final] = Queen(rank_final, file_final, piece.player)
+            pieces.append(self.grid[rank_final, file_final])
+            self.material[piece.player] += self.grid[rank_final, file_final].value - piece.value
+            self.halfmove_clock = 0
         else:
-            board.grid[rank_final, file_final] = piece
+            self.grid[rank_final, file_final] = piece
             piece.change_position(rank_final, file_final)
-        board.grid[rank_initial, file_initial] = None
+        self.grid[rank_initial, file_initial] = None
+        self.piece_codes[rank_final, file_final] = PIECE_CODES[self.grid[rank_final, file_final].name]
+        self.piece_codes[rank_initial, file_initial] = 0
 
-        for piece in board.player0_pieces + board.player1_pieces:
-            piece.moves = piece.get_moves(board)
+        self._turn = 1 - self._turn
+        self.hash = key ^ halfmove_key(self.halfmove_clock) ^ piece_key(self.grid[rank_final, file_final].name, rank_final, file_final)
+        self.history.append(record + (captured, captured_index, promoted_index))
 
-        board.turn = 1-board.turn
+    def unmake_move(self):
+        record = self.history.pop()
+        if record is None:
+            return
 
-        return board
-    
-    def is_checkmate(self) -> bool:
+        piece, rank_initial, file_initial, rank_final, file_final, halfmove_clock, fullmove_number, self.hash, \
+            captured, captured_index, promoted_index = record
+        self._turn = 1 - self._turn
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+
+        if promoted_index is not None:
+            pieces = self.get_pieces(piece.player)
+            self.material[piece.player] -= pieces.pop().value - piece.value
+            pieces.insert(promoted_index, piece)
+        else:
+            piece.change_position(rank_initial, file_initial)
+        self.grid[rank_initial, file_initial] = piece
+        self.piece_codes[rank_initial, file_initial] = PIECE_CODES[piece.name]
+
+        self.grid[rank_final, file_final] = captured
+        self.piece_codes[rank_final, file_final] = 0 if captured is None else PIECE_CODES[captured.name]
+        if captured is not None:
+            self.get_pieces(captured.player).insert(captured_index, captured)
+            if captured is not self.King0 and captured is not self.King1:
+                self.material[captured.player] += captured.value
+
+    def mobility(self, player: int) -> int:
+        # Pseudo-legal move count, equal to summing len(piece.possible_moves(self))
+        # over the player's pieces but read straight from the attack tables.
+        grid = self.grid
+        count = 0
+        for piece in self.get_pieces(player):
+            name = piece.name
+            rank, file = piece.rank, piece.file
+            if name in "Pp":
+                step = -1 if player else 1
+                ahead = rank + step
+                if not 0 <= ahead < BOARD_SIZE:
+                    continue
+                if grid[ahead, file] is None:
+                    count += 1
+                    if rank == (6 if player else 1) and grid[ahead + step, file] is None:
+                        count += 1
+                for f in (file - 1, file + 1):
+                    if 0 <= f < BOARD_SIZE:
+                        target = grid[ahead, f]
+                        if target is not None and target.player != player:
+                            count += 1
+            elif name in "NnKk":
+                for r, f in (KNIGHT_SQUARES if name in "Nn" else KING_SQUARES)[rank][file]:
+                    target = grid[r, f]
+                    if target is None or target.player != player:
+                        count += 1
+            else:
+                rays = RAYS[rank][file]
+                if name in "Rr":
+                    rays = rays[:4]
+                elif name in "Bb":
+                    rays = rays[4:]
+                for ray in rays:
+                    for r, f in ray:
+                        target = grid[r, f]
+                        if target is None:
+                            count += 1
+                            continue
+                        if target.player != player:
+                            count += 1
+                        break
+        return count
+
+    def in_check(self) -> bool:
         king = self.King1 if self.turn else self.King0
-        opp_pieces = self.player0_pieces if self.turn else self.player1_pieces
-        if not any([piece.can_capture(king.rank, king.file, self) for piece in opp_pieces]):
-            return False
+        return self.is_square_attacked(king.rank, king.file, 1 - self.turn)
+
+    def has_legal_move(self, ignore_halfmove=False) -> bool:
+        return next(self._legal_targets(ignore_halfmove), None) is not None
+
+    def is_checkmate(self) -> bool:
+        return self.in_check() and not self.has_legal_move(ignore_halfmove=True)
 
-        pieces = self.player1_pieces if self.turn else self.player0_pieces
-        for piece in pieces:
-            for rank, file in piece.possible_moves(self):
-                tmp_board = self.move(piece.rank, piece.file, rank, file)
-                if tmp_board.is_legal(ignore_halfmove=True):
-                    #print(rank, file)
-                    return False
-        return True
-    
     def is_stalemate(self) -> bool:
-        pieces = self.player1_pieces if self.turn else self.player0_pieces
-        for piece in pieces:
-            moves = piece.possible_moves(self)
-            for move in moves:
-                if self.move(piece.rank, piece.file, move[0], move[1]).is_legal():
-                    return False
-        return True
+        return not self.has_legal_move()
 
     def get_display(self) -> str:
         piece_symbols = {
@@ -196,51 +553,13 @@ class Board():
         return pd
     
     def get_board_tensor(self):
-        piece_to_encoding = {
-            'P': 1,
-            'N': 2,
-            'B': 3,
-            'R': 4,
-            'Q': 5,
-            'K': 6,
-            'p': -1,
-            'n': -2,
-            'b': -3,
-            'r': -4,
-            'q': -5,
-            'k': -6,
-        }
-
-        piece_grid = np.zeros((8, 8), dtype=np.float32)
-        diag_grid = np.zeros((8, 8), dtype=np.float32)
-        cross_grid = np.zeros((8, 8), dtype=np.float32)
-        knight_grid = np.zeros((8, 8), dtype=np.float32)
-        king_grid = np.zeros((8, 8), dtype=np.float32)
-        for i in range(8):
-            for j in range(8):
-                piece = self.grid[i, j]
-                if piece is not None:
-                    marker = -1 if piece.player else 1
-                    piece_grid[i, j] = marker
-                    if piece.name in "QqBb":
-                        diag_grid[i,j] =  marker
-                    if piece.name in "QqRr":
-                        cross_grid[i,j] = marker
-                    if piece.name in "Nn":
-                        knight_grid[i,j] = marker
-                    if piece.name in "Kk":
-                        king_grid[i,j] = marker
-
-        # Channel 2: Halfmove clock (normalized)
-        halfmove_channel = np.full((8, 8), self.halfmove_clock / self.stalemate_threshold, dtype=np.float32)
-
-        return np.stack([piece_grid, diag_grid, cross_grid, knight_grid, king_grid, halfmove_channel], axis=0)
+        return encode_codes(self.piece_codes, self.halfmove_clock, self.stalemate_threshold)[0]
     
 class EndBoard(Board):
     def __init__(self):
         super().__init__()
 
-    def initialize(self):
+    def initialize(self, placement=None):
         placement = {
             'K': (King, [(0, 1, 0), (6, 6, 1)]),
             'Q': (Queen, [(1, 5, 1)]),
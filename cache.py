@@ -0,0 +1,92 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+
+import pickle
+from collections import OrderedDict
+
+from evaluation import Evaluator
+
+
+class EvalCache():
+    # Bounded LRU store of evaluations keyed by (namespace, position hash), so
+    # several evaluators can share one cache without mixing their scores.
+    def __init__(self, capacity: int = 1 << 20):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, key: int):
+        entry = self.entries.get((namespace, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end((namespace, key))
+        return entry
+
+    def put(self, namespace: str, key: int, value: float):
+        self.entries[(namespace, key)] = value
+        self.entries.move_to_end((namespace, key))
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(list(self.entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: str):
+        # Loaded entries count as least recently used.
+        with open(path, "rb") as f:
+            items = pickle.load(f)
+        current = self.entries
+        self.entries = OrderedDict(items[-self.capacity:])
+        for key, value in current.items():
+            self.put(key[0], key[1], value)
+        return self
+
+
+class CachedEvaluator(Evaluator):
+    def __init__(self, evaluator, cache: EvalCache = None, namespace: str = None):
+        self.evaluator = evaluator
+        self.cache = cache if cache is not None else EvalCache()
+        self.namespace = namespace or type(evaluator).__name__
+
+    def evaluate(self, board: 'Board'):
+        value = self.cache.get(self.namespace, board.hash)
+        if value is None:
+            value = self.evaluator.evaluate(board)
+            self.cache.put(self.namespace, board.hash, value)
+        return value
+
+    def evaluate_batch(self, boards: list) -> list:
+        scores = [self.cache.get(self.namespace, board.hash) for board in boards]
+        misses = [i for i, score in enumerate(scores) if score is None]
+        if misses:
+            for i, value in zip(misses, self.evaluator.evaluate_batch([boards[i] for i in misses])):
+                self.cache.put(self.namespace, boards[i].hash, value)
+                scores[i] = value
+        return scores
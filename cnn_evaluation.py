@@ -0,0 +1,56 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+from encoding import encode_boards
+from evaluation import split_checkmates
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+class CNNEvaluator(nn.Module):
+    def __init__(self):
+        super(CNNEvaluator, self).__init__()
+        self.conv1 = nn.Conv2d(in_channels=6, out_channels=32, kernel_size=3, padding=1)
+        self.conv2 = nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, padding=1)
+        self.conv3 = nn.Conv2d(in_channels=64, out_channels=128, kernel_size=3, padding=1)
+        self.fc1 = nn.Linear(128 * 8 * 8, 512)
+        self.fc2 = nn.Linear(512, 1)
+        self.dropout = nn.Dropout(0.2)
+
+    def forward(self, x):
+        x = F.relu(self.conv1(x))
+        x = F.relu(self.conv2(x))
+        x = F.relu(self.conv3(x))
+        x = x.view(x.size(0), -1)  # Flatten for fully connected layers
+        x = F.relu(self.fc1(x))
+        x = self.dropout(x)
+        x = torch.tanh(self.fc2(x))  # Output between -1 and 1
+        return x
+    
+    def evaluate(self, board: 'Board'):
+        if board.is_checkmate():
+            if board.turn == 0:
+                return -float('inf')
+            elif board.turn == 1:
+                return float('inf')
+        return self.forward(torch.tensor(board.get_board_tensor()).unsqueeze(0)).item()
+
+    def evaluate_batch(self, boards: list) -> list:
+        scores, pending = split_checkmates(boards)
+        if pending:
+            batch = torch.from_numpy(encode_boards([boards[i] for i in pending]))
+            with torch.no_grad():
+                values = self.forward(batch).squeeze(1).tolist()
+            for i, value in zip(pending, values):
+                scores[i] = value
+        return scores
+
+def load_cnn(model_path: str = None, model_seed: int = 0) -> CNNEvaluator:
+    # Seeded so untrained models are identical across processes.
+    torch.manual_seed(model_seed)
+    model = CNNEvaluator()
+    if model_path is not None:
+        model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+    return model
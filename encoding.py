@@ -0,0 +1,49 @@
+import numpy as np
+
+PIECE_CODES = {
+    'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+    'p': -1, 'n': -2, 'b': -3, 'r': -4, 'q': -5, 'k': -6,
+}
+CODE_NAMES = {code: name for name, code in PIECE_CODES.items()}
+
+NUM_PLANES = 6
+
+# Row code+6 holds the (piece, diagonal, cross, knight, king) plane values for
+# that code, matching the layout CNNEvaluator checkpoints were trained on.
+PLANE_TABLE = np.zeros((13, NUM_PLANES - 1), dtype=np.float32)
+for _name, _code in PIECE_CODES.items():
+    _marker = 1 if _code > 0 else -1
+    PLANE_TABLE[_code + 6, 0] = _marker
+    if _name in "QqBb":
+        PLANE_TABLE[_code + 6, 1] = _marker
+    if _name in "QqRr":
+        PLANE_TABLE[_code + 6, 2] = _marker
+    if _name in "Nn":
+        PLANE_TABLE[_code + 6, 3] = _marker
+    if _name in "Kk":
+        PLANE_TABLE[_code + 6, 4] = _marker
+
+
+def encode_codes(codes, halfmove_clocks, stalemate_thresholds=20, out=None) -> np.ndarray:
+    codes = np.asarray(codes, dtype=np.int8).reshape(-1, 64)
+    n = codes.shape[0]
+    if out is None:
+        out = np.empty((n, NUM_PLANES, 8, 8), dtype=np.float32)
+    out[:, :NUM_PLANES - 1] = PLANE_TABLE[codes.astype(np.intp) + 6].transpose(0, 2, 1).reshape(n, NUM_PLANES - 1, 8, 8)
+    halfmove = np.asarray(halfmove_clocks, dtype=np.float64) / np.asarray(stalemate_thresholds, dtype=np.float64)
+    out[:, NUM_PLANES - 1] = np.broadcast_to(halfmove, (n,)).astype(np.float32)[:, None, None]
+    return out
+
+
+def encode_boards(boards, out=None) -> np.ndarray:
+    n = len(boards)
+    if out is None:
+        out = np.empty((n, NUM_PLANES, 8, 8), dtype=np.float32)
+    codes = np.empty((n, 64), dtype=np.int8)
+    halfmove = np.empty(n, dtype=np.float64)
+    thresholds = np.empty(n, dtype=np.float64)
+    for i, board in enumerate(boards):
+        codes[i] = board.get_piece_codes().reshape(64)
+        halfmove[i] = board.halfmove_clock
+        thresholds[i] = board.stalemate_threshold
+    return encode_codes(codes, halfmove, thresholds, out=out[:n])
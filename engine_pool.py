@@ -0,0 +1,180 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+
+import os
+import queue
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+
+from evaluation import Evaluator, STOCKFISH_PATH
+from positions import read_fens
+
+STANDIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci_standin.py")
+
+
+def standin_command() -> list:
+    return [sys.executable, STANDIN_PATH]
+
+
+class UCIEngine():
+    # One UCI subprocess driven synchronously; only used by one thread at a time.
+    def __init__(self, command, options: dict = None):
+        if isinstance(command, str):
+            command = [command]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+        self.send("uci")
+        self.read_until("uciok")
+        for name, value in (options or {}).items():
+            self.send("setoption name %s value %s" % (name, value))
+        self.ready()
+
+    def send(self, command: str):
+        self.process.stdin.write(command + "\n")
+        self.process.stdin.flush()
+
+    def read_until(self, prefix: str) -> list:
+        lines = []
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("UCI engine exited unexpectedly")
+            line = line.strip()
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+
+    def ready(self):
+        self.send("isready")
+        self.read_until("readyok")
+
+    def analyse(self, fen: str, depth: int = None, nodes: int = None, movetime: int = None):
+        # Returns (score, best move) with the score in pawns from player 0's point
+        # of view, +-inf for a forced mate, like StockfishEvaluator.
+        self.send("position fen " + fen)
+        limits = ""
+        if depth is not None:
+            limits += " depth %d" % depth
+        if nodes is not None:
+            limits += " nodes %d" % nodes
+        if movetime is not None:
+            limits += " movetime %d" % movetime
+        self.send("go" + limits)
+        score = 0.0
+        lines = self.read_until("bestmove")
+        for line in lines:
+            tokens = line.split()
+            if tokens[0] == "info" and "score" in tokens:
+                i = tokens.index("score")
+                if tokens[i + 1] == "cp":
+                    score = int(tokens[i + 2]) / 100
+                elif tokens[i + 1] == "mate":
+                    score = float("inf") if int(tokens[i + 2]) > 0 else -float("inf")
+        tokens = lines[-1].split()
+        best = tokens[1] if len(tokens) > 1 and tokens[1] != "(none)" else None
+        if fen.split()[1] == "b":
+            score = -score
+        return score, best
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.send("quit")
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class EnginePool():
+    # Engines run in their own processes, so threads are enough to keep all of them busy.
+    def __init__(self, command=STOCKFISH_PATH, size: int = None, depth: int = 6, nodes: int = None,
+                 movetime: int = None, options: dict = None):
+        self.size = size or cpu_count()
+        self.depth = depth
+        self.nodes = nodes
+        self.movetime = movetime
+        self.engines = [UCIEngine(command, options) for _ in range(self.size)]
+        self.idle = queue.Queue()
+        for engine in self.engines:
+            self.idle.put(engine)
+        self.executor = ThreadPoolExecutor(self.size)
+
+    def analyse(self, fen: str):
+        engine = self.idle.get()
+        try:
+            return engine.analyse(fen, self.depth, self.nodes, self.movetime)
+        finally:
+            self.idle.put(engine)
+
+    def evaluate_fen(self, fen: str) -> float:
+        return self.analyse(fen)[0]
+
+    def evaluate_fens(self, fens) -> list:
+        return list(self.executor.map(self.evaluate_fen, fens))
+
+    def close(self):
+        self.executor.shutdown()
+        for engine in self.engines:
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class EnginePoolEvaluator(Evaluator):
+    def __init__(self, pool: EnginePool):
+        self.pool = pool
+
+    def evaluate(self, board: 'Board'):
+        return self.pool.evaluate_fen(board.get_fen())
+
+    def evaluate_batch(self, boards: list) -> list:
+        return self.pool.evaluate_fens([board.get_fen() for board in boards])
+
+
+def label_file(pool: EnginePool, input_path: str, output_path: str, chunk_size: int = 1024) -> int:
+    # Writes "<fen> <score>" lines, which positions.read_fens/parse_fen read back.
+    count = 0
+    with open(output_path, "w") as out:
+        chunk = []
+        for fen in read_fens(input_path):
+            chunk.append(" ".join(fen.split()[:6]))
+            if len(chunk) == chunk_size:
+                count += _write_labels(pool, chunk, out)
+                chunk = []
+        if chunk:
+            count += _write_labels(pool, chunk, out)
+    return count
+
+
+def _write_labels(pool: EnginePool, fens: list, out) -> int:
+    for fen, score in zip(fens, pool.evaluate_fens(fens)):
+        out.write("%s %s\n" % (fen, score))
+    return len(fens)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Label FEN files with a pool of UCI engines")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--engine", default=None, help="engine binary (default: STOCKFISH_PATH)")
+    parser.add_argument("--standin", action="store_true", help="use the bundled material-only engine")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--depth", type=int, default=6)
+    args = parser.parse_args()
+
+    command = standin_command() if args.standin else (args.engine or STOCKFISH_PATH)
+    start = time.perf_counter()
+    with EnginePool(command, args.workers, args.depth) as pool:
+        count = label_file(pool, args.input, args.output)
+    elapsed = time.perf_counter() - start
+    print("%d positions in %.1fs (%.0f/s)" % (count, elapsed, count / elapsed if elapsed else 0))
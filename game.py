@@ -2,13 +2,81 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from search import Search
 
-from board import Board
+from board import Board, encode_move, decode_move
+from array import array
 from copy import deepcopy
+import time
 import numpy as np
 
+# Share of the remaining clock spent on one move.
+MOVES_TO_GO = 30
+
+
+class MoveHistory:
+    # The positions of a game as the piece codes of its initial board plus two
+    # bytes per move. Indexing and iteration rebuild boards on demand;
+    # iter_boards, iter_codes, iter_tensors and iter_fens stream the plies
+    # through one board instead.
+    def __init__(self, initial: Board, moves=()):
+        self.board_cls = type(initial)
+        self.codes = initial.get_piece_codes().copy()
+        self.turn = initial.turn
+        self.halfmove_clock = initial.halfmove_clock
+        self.fullmove_number = initial.fullmove_number
+        self.moves = array('H', moves)
+
+    def initial_board(self) -> Board:
+        return self.board_cls.from_codes(self.codes, self.turn, self.halfmove_clock, self.fullmove_number)
+
+    def append(self, move: int):
+        self.moves.append(move)
+
+    def __len__(self) -> int:
+        return len(self.moves) + 1
+
+    def __getitem__(self, ply: int) -> Board:
+        if ply < 0:
+            ply += len(self)
+        if not 0 <= ply < len(self):
+            raise IndexError("ply out of range")
+        board = self.initial_board()
+        for move in self.moves[:ply]:
+            board.make_move(*decode_move(move))
+        return board
+
+    def __iter__(self):
+        for board in self.iter_boards():
+            yield board.copy()
+
+    def iter_boards(self):
+        # The same board object is yielded at every ply; copy it to keep it.
+        board = self.initial_board()
+        yield board
+        for move in self.moves:
+            board.make_move(*decode_move(move))
+            yield board
+
+    def iter_codes(self):
+        for board in self.iter_boards():
+            yield board.get_piece_codes(), board.halfmove_clock
+
+    def iter_tensors(self):
+        for board in self.iter_boards():
+            yield board.get_board_tensor()
+
+    def iter_fens(self):
+        for board in self.iter_boards():
+            yield board.get_fen()
+
 
 class Game:
-    def __init__(self, search0: 'Search', search1: 'Search', p: float=1, stop_threshold: float = 2000):
+    def __init__(self, search0: 'Search', search1: 'Search', p: float=1, stop_threshold: float = 2000, board_cls=Board,
+                 base_time: float = None, increment: float = 0):
+        # base_time/increment (seconds) give each player a clock; each move
+        # gets a time limit from it and a player whose clock runs out loses.
+        self.board_cls = board_cls
+        self.base_time = base_time
+        self.increment = increment
         self.initialize()
         self.search0 = search0
         self.search1 = search1
@@ -16,16 +84,27 @@ class Game:
         self.stop_threshold = stop_threshold
 
     def initialize(self):
-        self.board = Board()
-        self.move_history = []
+        self.board = self.board_cls()
+        self.move_history = None
+        self.last_move = None
+        self.clocks = [self.base_time, self.base_time] if self.base_time is not None else None
+        self.flagged = None
+
+    def advance(self, board: Board):
+        self.search0.advance(board)
+        if self.search1 is not self.search0:
+            self.search1.advance(board)
 
     def play(self, show=False):
         if show:
             print(self.board.get_display())
-        self.move_history.append(self.board)
+        # Only the current board is kept; earlier plies live in move_history.
+        self.move_history = MoveHistory(self.board)
+        state = self.board
+        self.advance(state)
 
         while True:
-            next_state = self.next_state(self.move_history[-1])
+            next_state = self.next_state(state)
             if next_state is None:
                 break
 
@@ -36,20 +115,39 @@ class Game:
                 print("Move:", next_state.fullmove_number)
                 print("Evaluation 0:", self.search0.evaluator.evaluate(next_state))
                 print("Evaluation 1:", self.search1.evaluator.evaluate(next_state))
+                if self.clocks is not None:
+                    print("Clocks: %.2f %.2f" % tuple(self.clocks))
                 print(next_state.get_display())
                 print()
-            self.move_history.append(next_state)
+            self.move_history.append(self.last_move)
+            state = next_state
+            self.advance(next_state)
             if next_state.is_checkmate() or next_state.fullmove_number > 100:
                 break
         
-        last_state = self.move_history[-1]
-        evaluator = self.search1.evaluator if last_state.turn else self.search0.evaluator
-        return self.move_history, last_state.is_checkmate(), evaluator.evaluate(self.move_history[-1])
+        if self.flagged is not None:
+            return self.move_history, False, -float('inf') if self.flagged == 0 else float('inf')
+        evaluator = self.search1.evaluator if state.turn else self.search0.evaluator
+        return self.move_history, state.is_checkmate(), evaluator.evaluate(state)
             
+    def allot_time(self, player: int) -> float:
+        clock = self.clocks[player]
+        return min(clock / MOVES_TO_GO + self.increment, clock / 2)
+
     def next_state(self, cur_state: Board) -> Board:
         search = self.search1 if cur_state.turn else self.search0
 
+        if self.clocks is not None:
+            player = cur_state.turn
+            search.set_limits(self.allot_time(player), search.node_limit)
+            start = time.perf_counter()
         results = search.get_moves_ranked(cur_state)
+        if self.clocks is not None:
+            self.clocks[player] -= time.perf_counter() - start
+            if self.clocks[player] < 0:
+                self.flagged = player
+                return None
+            self.clocks[player] += self.increment
 
         if results:
             i = 0
@@ -57,5 +155,6 @@ class Game:
                 i += 1
             i %= len(results)
             _, _, initial_rank, initial_file, final_rank, final_file = results[i]
+            self.last_move = encode_move(initial_rank, initial_file, final_rank, final_file)
             return cur_state.move(initial_rank, initial_file, final_rank, final_file)
         return None
@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must not pull in torch or stockfish when imported.
+PURE_MODULES = ["board", "bitboard", "search", "evaluation", "game", "perft", "positions", "cache", "engine_pool",
+                "parallel_search"]
+HEAVY_MODULES = ["cnn_evaluation", "stockfish_evaluation"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "torch": "torch" in sys.modules, "stockfish": "stockfish" in sys.modules}))
+"""
+
+
+def time_import(module: str) -> dict:
+    # A fresh interpreter per sample so nothing is already cached in sys.modules.
+    output = subprocess.check_output([sys.executable, "-c", _PROBE % module],
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run_benchmark(modules, repeat: int = 5, verbose: bool = True) -> dict:
+    results = {}
+    for module in modules:
+        samples = [time_import(module) for _ in range(repeat)]
+        seconds = sorted(sample["seconds"] for sample in samples)
+        results[module] = {
+            "min": seconds[0],
+            "median": seconds[len(seconds) // 2],
+            "torch": samples[0]["torch"],
+            "stockfish": samples[0]["stockfish"],
+        }
+        if verbose:
+            print("%-22s min %8.1fms  median %8.1fms  torch %-5s  stockfish %s" % (
+                module, results[module]["min"] * 1000, results[module]["median"] * 1000,
+                results[module]["torch"], results[module]["stockfish"]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the engine modules")
+    parser.add_argument("modules", nargs="*", default=PURE_MODULES + HEAVY_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.repeat)
+    leaks = [module for module in args.modules
+             if module in PURE_MODULES and (results[module]["torch"] or results[module]["stockfish"])]
+    if leaks:
+        print("torch/stockfish imported by:", ", ".join(leaks))
+        sys.exit(1)
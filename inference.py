@@ -0,0 +1,156 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+import torch
+
+from encoding import encode_codes
+from evaluation import Evaluator, split_checkmates
+from cnn_evaluation import load_cnn
+
+# Seconds a RemoteEvaluator waits for a free client id before giving up.
+CONNECT_TIMEOUT = 30
+
+
+def _serve(model_path, model_seed, torch_threads, requests, responses, max_batch, max_latency, stats):
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    model = load_cnn(model_path, model_seed)
+    running = True
+    while running:
+        message = requests.get()
+        if message is None:
+            break
+        pending = [message]
+        size = len(message[2])
+        # Keep collecting until the batch is full or the oldest request hits its deadline.
+        deadline = time.perf_counter() + max_latency
+        while size < max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                message = requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if message is None:
+                running = False
+                break
+            pending.append(message)
+            size += len(message[2])
+
+        codes = np.concatenate([message[2] for message in pending])
+        halfmove = np.concatenate([message[3] for message in pending])
+        thresholds = np.concatenate([message[4] for message in pending])
+        with torch.no_grad():
+            values = model(torch.from_numpy(encode_codes(codes, halfmove, thresholds))).numpy()[:, 0]
+        start = 0
+        for client_id, request_id, request_codes, _, _ in pending:
+            responses[client_id].put((request_id, values[start:start + len(request_codes)]))
+            start += len(request_codes)
+        with stats.get_lock():
+            stats[0] += 1
+            stats[1] += size
+
+
+class InferenceConnection():
+    # Picklable handle passed to worker processes; each worker claims one client id.
+    def __init__(self, requests, responses, free_ids):
+        self.requests = requests
+        self.responses = responses
+        self.free_ids = free_ids
+        self.num_clients = len(responses)
+
+
+class InferenceServer():
+    # A separate process owning the model that coalesces evaluation requests from
+    # many RemoteEvaluators into batches of up to max_batch positions, waiting at
+    # most max_latency seconds after the first request of a batch.
+    def __init__(self, model_path: str = None, num_clients: int = 1, max_batch: int = 256,
+                 max_latency: float = 0.002, model_seed: int = 0, torch_threads: int = None):
+        context = multiprocessing.get_context()
+        self.num_clients = num_clients
+        self.requests = context.Queue()
+        self.responses = [context.Queue() for _ in range(num_clients)]
+        self.free_ids = context.Queue()
+        for client_id in range(num_clients):
+            self.free_ids.put(client_id)
+        # [batches, positions]
+        self.stats = context.Array('q', 2)
+        self.process = context.Process(
+            target=_serve, daemon=True,
+            args=(model_path, model_seed, torch_threads, self.requests, self.responses, max_batch, max_latency,
+                  self.stats))
+
+    def connection(self) -> InferenceConnection:
+        return InferenceConnection(self.requests, self.responses, self.free_ids)
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def close(self):
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join()
+
+    def get_stats(self) -> dict:
+        batches, positions = self.stats[:]
+        return {
+            "batches": batches,
+            "positions": positions,
+            "mean_batch": positions / batches if batches else 0.0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RemoteEvaluator(Evaluator):
+    # Drop-in for CNNEvaluator that sends piece codes to an InferenceServer.
+    def __init__(self, connection: InferenceConnection):
+        try:
+            self.client_id = connection.free_ids.get(timeout=CONNECT_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError("No free inference client id: the server only has %d clients"
+                               % connection.num_clients) from None
+        self.requests = connection.requests
+        self.free_ids = connection.free_ids
+        self.responses = connection.responses[self.client_id]
+        self.request_id = 0
+
+    def close(self):
+        # Hands the client id back so a later evaluator can connect.
+        if self.client_id is not None:
+            self.free_ids.put(self.client_id)
+            self.client_id = None
+
+    def evaluate(self, board: 'Board'):
+        return self.evaluate_batch([board])[0]
+
+    def evaluate_batch(self, boards: list) -> list:
+        scores, pending = split_checkmates(boards)
+        if pending:
+            codes = np.empty((len(pending), 64), dtype=np.int8)
+            halfmove = np.empty(len(pending), dtype=np.float64)
+            thresholds = np.empty(len(pending), dtype=np.float64)
+            for j, i in enumerate(pending):
+                codes[j] = boards[i].get_piece_codes().reshape(64)
+                halfmove[j] = boards[i].halfmove_clock
+                thresholds[j] = boards[i].stalemate_threshold
+            self.request_id += 1
+            self.requests.put((self.client_id, self.request_id, codes, halfmove, thresholds))
+            request_id, values = self.responses.get()
+            if request_id != self.request_id:
+                raise RuntimeError("Inference response %d does not match request %d" % (request_id, self.request_id))
+            for i, value in zip(pending, values.tolist()):
+                scores[i] = value
+        return scores
@@ -0,0 +1,177 @@
+import random
+import time
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from board import Board, decode_move
+from cnn_evaluation import load_cnn
+from encoding import NUM_PLANES, encode_boards
+from evaluation import Evaluator, split_checkmates
+
+BATCH_SIZES = (1, 32, 256)
+
+
+def example_input(batch_size: int = 1) -> torch.Tensor:
+    return torch.zeros((batch_size, NUM_PLANES, 8, 8), dtype=torch.float32)
+
+
+def export_torchscript(model: nn.Module, path: str = None):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        traced = torch.jit.trace(model.eval(), example_input())
+    if path is not None:
+        traced.save(path)
+    return traced
+
+
+def export_onnx(model: nn.Module, path: str):
+    # Needs the onnx exporter dependencies (onnx/onnxscript), which are optional.
+    torch.onnx.export(model.eval(), example_input(), path, input_names=["planes"], output_names=["value"],
+                      dynamic_axes={"planes": {0: "batch"}, "value": {0: "batch"}})
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    # int8 weights for the linear layers, where fc1 holds ~90% of the FLOPs.
+    # Activations are quantized per call, so scores depend slightly on what
+    # else is in the batch.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+class ModuleEvaluator(Evaluator):
+    # CNNEvaluator's evaluate/evaluate_batch around any module mapping (N,6,8,8)
+    # planes to (N,1) values, e.g. a TorchScript or quantized model.
+    def __init__(self, module):
+        self.module = module
+
+    def forward_planes(self, planes: np.ndarray) -> list:
+        with torch.no_grad():
+            return self.module(torch.from_numpy(planes)).squeeze(1).tolist()
+
+    def evaluate(self, board: 'Board'):
+        return self.evaluate_batch([board])[0]
+
+    def evaluate_batch(self, boards: list) -> list:
+        scores, pending = split_checkmates(boards)
+        if pending:
+            values = self.forward_planes(encode_boards([boards[i] for i in pending]))
+            for i, value in zip(pending, values):
+                scores[i] = value
+        return scores
+
+
+class OnnxEvaluator(ModuleEvaluator):
+    def __init__(self, path: str, threads: int = 1):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        super().__init__(None)
+
+    def forward_planes(self, planes: np.ndarray) -> list:
+        return self.session.run(["value"], {"planes": planes})[0][:, 0].tolist()
+
+
+def load_torchscript(path: str) -> ModuleEvaluator:
+    return ModuleEvaluator(torch.jit.load(path))
+
+
+def load_quantized_cnn(model_path: str = None, model_seed: int = 0) -> ModuleEvaluator:
+    return ModuleEvaluator(quantize(load_cnn(model_path, model_seed)))
+
+
+def held_out_positions(count: int = 2048, seed: int = 1234, max_plies: int = 80) -> np.ndarray:
+    # Random playouts from the start position; pass FEN-file tensors
+    # (positions.load_tensors) instead to check on real data.
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        for _ in range(rng.randrange(max_plies)):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.make_move(*decode_move(rng.choice(moves)))
+        boards.append(board.copy())
+    return encode_boards(boards)
+
+
+def accuracy(reference, candidate, planes: np.ndarray, batch_size: int = 256) -> dict:
+    expected, actual = [], []
+    for start in range(0, len(planes), batch_size):
+        chunk = planes[start:start + batch_size]
+        expected.extend(reference.forward_planes(chunk))
+        actual.extend(candidate.forward_planes(chunk))
+    expected, actual = np.array(expected), np.array(actual)
+    error = np.abs(expected - actual)
+    return {
+        "max_error": float(error.max()),
+        "mean_error": float(error.mean()),
+        "sign_agreement": float(np.mean(np.sign(expected) == np.sign(actual))),
+    }
+
+
+def latency(evaluator, planes: np.ndarray, batch_sizes=BATCH_SIZES, repeat: int = 20) -> dict:
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.ascontiguousarray(planes[:batch_size])
+        evaluator.forward_planes(batch)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            evaluator.forward_planes(batch)
+            samples.append(time.perf_counter() - start)
+        results[batch_size] = float(np.median(samples))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from positions import load_tensors
+
+    parser = argparse.ArgumentParser(description="Export CNNEvaluator and compare fp32, TorchScript and int8 paths")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--positions", default=None, help="held-out FEN file (default: random playouts)")
+    parser.add_argument("--count", type=int, default=2048)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    model = load_cnn(args.model)
+    if args.positions:
+        planes = np.concatenate(list(load_tensors(args.positions)))[:args.count]
+    else:
+        planes = held_out_positions(args.count)
+    planes = np.concatenate([planes] * (max(BATCH_SIZES) // len(planes) + 1))[:max(len(planes), max(BATCH_SIZES))]
+
+    fp32 = ModuleEvaluator(model)
+    variants = {
+        "fp32": fp32,
+        "torchscript": ModuleEvaluator(export_torchscript(model, os.path.join(args.out_dir, "cnn.pt"))),
+        "int8": ModuleEvaluator(quantize(model)),
+    }
+    variants["int8_torchscript"] = ModuleEvaluator(export_torchscript(variants["int8"].module,
+                                                                      os.path.join(args.out_dir, "cnn_int8.pt")))
+    try:
+        onnx_path = os.path.join(args.out_dir, "cnn.onnx")
+        export_onnx(model, onnx_path)
+        variants["onnx"] = OnnxEvaluator(onnx_path, args.threads)
+    except ImportError as error:
+        print("Skipping ONNX:", error)
+
+    print("%-18s %10s %10s %8s  %s" % ("variant", "max err", "mean err", "sign", "  ".join(
+        "%12s" % ("batch %d" % size) for size in BATCH_SIZES)))
+    for name, evaluator in variants.items():
+        acc = accuracy(fp32, evaluator, planes[:args.count])
+        times = latency(evaluator, planes, repeat=args.repeat)
+        print("%-18s %10.2e %10.2e %8.4f  %s" % (name, acc["max_error"], acc["mean_error"], acc["sign_agreement"],
+              "  ".join("%10.3fms" % (times[size] * 1000) for size in BATCH_SIZES)))
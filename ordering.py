@@ -0,0 +1,98 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+
+from board import PIECE_CLASSES, PROMOTION_FLAG
+from encoding import PIECE_CODES
+from transposition import NO_MOVE
+
+# Piece.value indexed by abs(piece code). Kings are worth infinity there, so
+# they get a finite value above the queen for ordering purposes.
+KING_ORDER_VALUE = 10
+PIECE_VALUES = [0] * 7
+for _name, _cls in PIECE_CLASSES.items():
+    if _name.isupper():
+        _value = _cls(0, 0, 0).value
+        PIECE_VALUES[PIECE_CODES[_name]] = _value if _value != float('inf') else KING_ORDER_VALUE
+PROMOTION_GAIN = PIECE_VALUES[PIECE_CODES['Q']] - PIECE_VALUES[PIECE_CODES['P']]
+
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 20
+
+
+def board_codes(board: 'Board') -> list:
+    return board.get_piece_codes().reshape(64).tolist()
+
+
+def is_tactical(codes: list, move: int) -> bool:
+    return codes[move >> 6 & 63] != 0 or move & PROMOTION_FLAG != 0
+
+
+def material_gain(codes: list, move: int) -> int:
+    gain = PIECE_VALUES[abs(codes[move >> 6 & 63])]
+    if move & PROMOTION_FLAG:
+        gain += PROMOTION_GAIN
+    return gain
+
+
+def mvv_lva(codes: list, move: int) -> int:
+    # Most valuable victim first, then least valuable attacker.
+    return material_gain(codes, move) * 16 - PIECE_VALUES[abs(codes[move & 63])]
+
+
+def tactical_moves(board: 'Board', codes: list = None) -> list:
+    # Captures and promotions only, best MVV-LVA first.
+    codes = codes if codes is not None else board_codes(board)
+    moves = [move for move in board.iter_legal_moves() if is_tactical(codes, move)]
+    moves.sort(key=lambda move: mvv_lva(codes, move), reverse=True)
+    return moves
+
+
+class MoveOrdering():
+    # Hash move, then captures/promotions by MVV-LVA, then killer moves for the
+    # ply, then quiet moves by their butterfly history score.
+    def __init__(self, max_ply: int = 64, num_killers: int = 2):
+        self.max_ply = max_ply
+        self.num_killers = num_killers
+        self.clear()
+
+    def clear(self):
+        self.killers = [[NO_MOVE] * self.num_killers for _ in range(self.max_ply)]
+        # [player][from | to << 6]
+        self.history = [[0] * 4096, [0] * 4096]
+
+    def new_search(self):
+        # Killers are position specific; history is kept but aged.
+        self.killers = [[NO_MOVE] * self.num_killers for _ in range(self.max_ply)]
+        for table in self.history:
+            for i, value in enumerate(table):
+                if value:
+                    table[i] = value >> 1
+
+    def order(self, board: 'Board', moves, ply: int = 0, hash_move: int = NO_MOVE) -> list:
+        codes = board_codes(board)
+        killers = self.killers[ply] if ply < self.max_ply else ()
+        history = self.history[board.turn]
+
+        def score(move):
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            if is_tactical(codes, move):
+                return CAPTURE_SCORE + mvv_lva(codes, move)
+            if move in killers:
+                return KILLER_SCORE - killers.index(move)
+            return history[move & 0xFFF]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def update(self, board: 'Board', move: int, depth: int, ply: int = 0):
+        # Called on a beta cutoff with the board still at the parent position.
+        if is_tactical(board_codes(board), move):
+            return
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers.insert(0, move)
+                killers.pop()
+        self.history[board.turn][move & 0xFFF] += depth * depth
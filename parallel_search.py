@@ -0,0 +1,159 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from evaluation import Evaluator
+
+import time
+from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from board import Board, decode_move
+from search import Search, AlphaBetaSearch
+
+# codes (64), turn, halfmove clock, fullmove number
+POSITION_SIZE = 67
+
+# Per-process state, filled once by _init_worker.
+_worker = {}
+
+
+def _init_worker(shm_name: str, search_cls, evaluator: 'Evaluator', depth: int, width: int, search_kwargs: dict):
+    shm = SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['position'] = np.ndarray(POSITION_SIZE, dtype=np.int16, buffer=shm.buf)
+    _worker['evaluator'] = evaluator
+    # Each root child is searched one ply shallower than the root.
+    _worker['search'] = search_cls(evaluator, depth - 1, width, **search_kwargs) if depth > 1 else None
+
+
+def _search_move(task):
+    board_cls, move, deadline, node_limit = task
+    start = time.process_time()
+    position = _worker['position']
+    board = board_cls.from_codes(position[:64].reshape(8, 8).astype(np.int8), int(position[64]), int(position[65]),
+                                 int(position[66]))
+    board.make_move(*decode_move(move))
+    search = _worker['search']
+    if search is not None:
+        search.set_limits(max(0.0, deadline - time.time()) if deadline is not None else None, node_limit)
+    ranked = search.get_moves_ranked(board) if search is not None else None
+    if ranked:
+        score = ranked[0][1]
+    elif search is None or board.is_checkmate():
+        score = _worker['evaluator'].evaluate(board)
+    else:
+        score = 0
+    return move, score, time.process_time() - start
+
+
+class ParallelSearch(Search):
+    # Splits the root moves across a process pool; each worker runs its own
+    # search_cls on one child at depth - 1. With AlphaBetaSearch, whose root
+    # scores are exact, the best move and score match the serial search; a
+    # beam search cuts its width per subtree here instead of across the whole
+    # ply, so it may pick differently. Workers read the root position from
+    # shared memory and only receive moves. Call close() (or use it as a
+    # context manager) to stop the pool.
+    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000, search_cls=AlphaBetaSearch,
+                 workers: int = None, **search_kwargs):
+        super().__init__(evaluator, depth, width)
+        self.workers = workers or cpu_count()
+        self.shm = SharedMemory(create=True, size=POSITION_SIZE * np.dtype(np.int16).itemsize)
+        self.position = np.ndarray(POSITION_SIZE, dtype=np.int16, buffer=self.shm.buf)
+        self.pool = Pool(self.workers, initializer=_init_worker,
+                         initargs=(self.shm.name, search_cls, evaluator, depth, width, search_kwargs))
+        self.stats = {}
+
+    def get_moves_ranked(self, board: Board) -> list:
+        moves = board.legal_moves().tolist()
+        if not moves:
+            return []
+        self.position[:64] = board.get_piece_codes().reshape(64)
+        self.position[64:] = (board.turn, board.halfmove_clock, board.fullmove_number)
+
+        # The deadline is wall-clock time so every worker process agrees on it;
+        # the node budget is shared out between the root moves.
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        node_limit = max(1, self.node_limit // len(moves)) if self.node_limit is not None else None
+        start = time.perf_counter()
+        results = self.pool.map(_search_move, [(type(board), move, deadline, node_limit) for move in moves],
+                                chunksize=1)
+        elapsed = time.perf_counter() - start
+        # Busy time is the workers' CPU time. busy_ratio is how many workers
+        # were busy on average and utilisation the share of the pool that was;
+        # benchmark() measures the speedup over the serial search.
+        busy = sum(seconds for _, _, seconds in results)
+        self.stats = {
+            "moves": len(moves),
+            "seconds": elapsed,
+            "busy": busy,
+            "busy_ratio": busy / elapsed if elapsed else 0.0,
+            "utilisation": busy / elapsed / self.workers if elapsed else 0.0,
+        }
+
+        results.sort(key=lambda x: x[1], reverse=not board.turn)
+        board_states = []
+        for move, score, _ in results[:self.width]:
+            move = decode_move(move)
+            board_states.append((board.move(*move), score, *move))
+        # Prioritize forced mates
+        if (-1 if board.turn else 1) * results[0][1] == float('inf'):
+            return board_states[:1]
+        return board_states
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.shm.close()
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def benchmark(board: Board, evaluator: 'Evaluator', depth: int, search_cls=AlphaBetaSearch, workers: int = None,
+              **search_kwargs) -> dict:
+    # Wall-clock speedup against the serial search on the same position.
+    workers = workers or cpu_count()
+    serial = search_cls(evaluator, depth, **search_kwargs)
+    start = time.perf_counter()
+    serial_ranked = serial.get_moves_ranked(board.copy())
+    serial_seconds = time.perf_counter() - start
+    with ParallelSearch(evaluator, depth, search_cls=search_cls, workers=workers, **search_kwargs) as search:
+        start = time.perf_counter()
+        parallel_ranked = search.get_moves_ranked(board.copy())
+        parallel_seconds = time.perf_counter() - start
+    speedup = serial_seconds / parallel_seconds
+    return {
+        "workers": workers,
+        "serial_seconds": serial_seconds,
+        "parallel_seconds": parallel_seconds,
+        "speedup": speedup,
+        "efficiency": speedup / workers,
+        "same_best": serial_ranked[0][1:] == parallel_ranked[0][1:],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from evaluation import get_evaluator
+
+    parser = argparse.ArgumentParser(description="Compare the parallel root search against the serial search")
+    parser.add_argument("--fen", default=None)
+    parser.add_argument("--evaluator", default="piece_position")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    board = Board.from_fen(args.fen) if args.fen else Board()
+    print(benchmark(board, get_evaluator(args.evaluator), args.depth, workers=args.workers))
@@ -0,0 +1,103 @@
+import argparse
+import sys
+import time
+
+from board import Board, EndBoard, decode_move
+from bitboard import BitBoard, EndBitBoard
+
+BOARD_CLASSES = {
+    'board': (Board, EndBoard),
+    'bitboard': (BitBoard, EndBitBoard),
+}
+
+# 'end' uses the EndBoard classes instead of a FEN.
+POSITIONS = {
+    'start': "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 0",
+    'end': None,
+    'debug': "1rb1q1nr/1pp1k1bp/2n1p3/3p4/p1PP3Q/4Pp1P/PP1NNPP1/R3KB1R b - - 0 0",
+    'promotion': "n6r/1P4P1/8/8/8/7k/3p1p2/K7 w - - 0 0",
+    'pins': "k3r3/pp6/2p5/8/7b/8/4RN2/3QK3 w - - 0 0",
+    # Only captures and promotions are legal from the third ply on.
+    'halfmove': "1rb1q1nr/1pp1k1bp/2n1p3/3p4/p1PP3Q/4Pp1P/PP1NNPP1/R3KB1R b - - 17 0",
+}
+
+# Leaf counts per depth, starting at depth 1. Generated with the original
+# copy-and-check move generator; the variant has no castling or en passant
+# and promotes to queens only.
+REFERENCE_COUNTS = {
+    'start': [20, 400, 8902, 197281],
+    'end': [2, 70, 78, 3023],
+    'debug': [6, 206, 6111, 207500],
+    'promotion': [7, 105, 1420, 22279],
+    'pins': [21, 443, 12053, 251941],
+    'halfmove': [6, 206, 1565, 53521],
+}
+
+
+def make_position(name: str, board_cls=Board):
+    end_cls = BOARD_CLASSES['bitboard' if issubclass(board_cls, BitBoard) else 'board'][1]
+    if name == 'end':
+        return end_cls()
+    return board_cls.from_fen(POSITIONS[name])
+
+
+def perft(board, depth: int) -> int:
+    if depth <= 0:
+        return 1
+    if depth == 1:
+        return board.count_legal_moves()
+    nodes = 0
+    for move in board.legal_moves():
+        board.make_move(*decode_move(move))
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def move_name(move: int) -> str:
+    rank_initial, file_initial, rank_final, file_final = decode_move(move)
+    return "%s%d%s%d" % (chr(ord('a') + file_initial), rank_initial + 1, chr(ord('a') + file_final), rank_final + 1)
+
+
+def divide(board, depth: int) -> dict:
+    counts = {}
+    for move in board.legal_moves():
+        board.make_move(*decode_move(move))
+        counts[move_name(move)] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+
+def run_suite(board_cls=Board, max_depth: int = 3, positions=None, verbose: bool = True) -> list:
+    failures = []
+    for name in positions or REFERENCE_COUNTS:
+        board = make_position(name, board_cls)
+        for depth, expected in enumerate(REFERENCE_COUNTS[name][:max_depth], start=1):
+            start = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = time.perf_counter() - start
+            ok = nodes == expected
+            if not ok:
+                failures.append((name, depth, nodes, expected))
+            if verbose:
+                print("%-10s depth %d  nodes %9d  expected %9d  %8.3fs  %10.0f nodes/s  %s" % (
+                    name, depth, nodes, expected, elapsed, nodes / elapsed if elapsed else 0, "ok" if ok else "MISMATCH"))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft move generator checks")
+    parser.add_argument("--board", choices=sorted(BOARD_CLASSES), default="board")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--position", action="append", choices=sorted(POSITIONS))
+    parser.add_argument("--divide", metavar="POSITION", choices=sorted(POSITIONS))
+    args = parser.parse_args()
+
+    board_cls = BOARD_CLASSES[args.board][0]
+    if args.divide:
+        counts = divide(make_position(args.divide, board_cls), args.depth)
+        for name in sorted(counts):
+            print(name, counts[name])
+        print("total", sum(counts.values()))
+    else:
+        sys.exit(1 if run_suite(board_cls, args.depth, args.position) else 0)
@@ -19,6 +19,11 @@ class Piece():
     def get_moves(self, board:'Board'):
         return [(self.rank, self.file)]
     
+    def copy(self) -> 'Piece':
+        piece = self.__class__.__new__(self.__class__)
+        piece.__dict__.update(self.__dict__)
+        return piece
+
     def change_position(self, rank: int, file: int):
         self.file = file
         self.rank = rank
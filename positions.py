@@ -0,0 +1,39 @@
+import numpy as np
+
+from board import Board, parse_fen
+from encoding import NUM_PLANES, encode_codes
+
+
+def read_fens(path: str):
+    # One FEN per line; anything after the sixth field (e.g. a label) is ignored.
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def load_boards(path: str, board_cls=Board):
+    for fen in read_fens(path):
+        yield board_cls.from_codes(*parse_fen(fen))
+
+
+def load_codes(path: str, batch_size: int = 4096):
+    codes = np.empty((batch_size, 8, 8), dtype=np.int8)
+    halfmove = np.empty(batch_size, dtype=np.float64)
+    n = 0
+    for fen in read_fens(path):
+        codes[n], _, halfmove[n], _ = parse_fen(fen)
+        n += 1
+        if n == batch_size:
+            yield codes[:n].copy(), halfmove[:n].copy()
+            n = 0
+    if n:
+        yield codes[:n].copy(), halfmove[:n].copy()
+
+
+def load_tensors(path: str, batch_size: int = 4096, stalemate_threshold: int = 20):
+    # Goes straight from FEN rows to network input without building boards.
+    out = np.empty((batch_size, NUM_PLANES, 8, 8), dtype=np.float32)
+    for codes, halfmove in load_codes(path, batch_size):
+        yield encode_codes(codes, halfmove, stalemate_threshold, out=out[:len(codes)]).copy()
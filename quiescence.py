@@ -0,0 +1,59 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+    from search import Search
+
+from board import decode_move
+from ordering import board_codes, material_gain, tactical_moves
+
+
+class Quiescence():
+    # Extends leaf evaluation through captures and promotions until the
+    # position is quiet. value_scale is evaluator units per pawn of material
+    # (PieceEvaluator counts material twice, CNNEvaluator outputs tanh values),
+    # used by delta pruning; delta=None turns delta pruning off.
+    def __init__(self, max_depth: int = 8, delta: float = 2, value_scale: float = 1):
+        self.max_depth = max_depth
+        self.delta = delta
+        self.value_scale = value_scale
+        self.nodes = 0
+
+    def search(self, search: 'Search', board: 'Board', alpha: float = -float('inf'), beta: float = float('inf'),
+               depth: int = 0) -> float:
+        # Negamax score from the side to move, like AlphaBetaSearch.negamax.
+        # The node at depth 0 is the caller's leaf, already counted in its
+        # search's nodes; the rest count against its node budget too.
+        self.nodes += 1
+        if depth > 0:
+            search.nodes += 1
+        search.check_limits()
+        color = -1 if board.turn else 1
+        stand_pat = color * search.evaluate(board)
+        if stand_pat in (float('inf'), -float('inf')) or depth >= self.max_depth:
+            return stand_pat
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        best_score = stand_pat
+        codes = board_codes(board)
+        for move in tactical_moves(board, codes):
+            if self.delta is not None and \
+                    stand_pat + (material_gain(codes, move) + self.delta) * self.value_scale < alpha:
+                continue
+            board.make_move(*decode_move(move))
+            try:
+                score = -self.search(search, board, -beta, -alpha, depth + 1)
+            finally:
+                # A SearchTimeout must not leave the caller's board changed.
+                board.unmake_move()
+            if score > best_score:
+                best_score = score
+            if score >= beta:
+                break
+            alpha = max(alpha, score)
+        return best_score
+
+    def evaluate(self, search: 'Search', board: 'Board') -> float:
+        # Same point of view as the evaluators: player 0's.
+        return (-1 if board.turn else 1) * self.search(search, board)
@@ -2,68 +2,200 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from evaluation import Evaluator
 
-from board import Board
+from board import Board, decode_move
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+from ordering import MoveOrdering
+from quiescence import Quiescence
+from search_tree import SearchTree
+import math
+import threading
+import time
 import numpy as np
 
+class SearchTimeout(Exception):
+    pass
+
+
 class Search():
-    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000):
+    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000, table: TranspositionTable = None,
+                 batch_size: int = 1, quiescence: Quiescence = None):
         self.evaluator = evaluator
         self.depth = depth
         self.width = width
+        self.table = table
+        self.batch_size = batch_size
+        self.quiescence = quiescence
+        self.time_limit = None
+        self.node_limit = None
+        self.deadline = None
+        self.interruptible = False
+        self.nodes = 0
+
+    def set_limits(self, time_limit: float = None, node_limit: int = None):
+        # Per-move budget in seconds and/or nodes; None means unlimited.
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+
+    def start_clock(self):
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        # The first iteration always completes so there is a move to return.
+        self.interruptible = False
+
+    def check_limits(self):
+        if not self.interruptible:
+            return
+        if (self.node_limit is not None and self.nodes >= self.node_limit) or \
+                (self.deadline is not None and time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+    def evaluate(self, board: Board):
+        # Static evaluations stay out of the transposition table, whose
+        # entries are search results; wrap the evaluator in a CachedEvaluator
+        # to cache them.
+        return self.evaluator.evaluate(board)
+
+    def evaluate_batch(self, boards: list) -> list:
+        return list(self.evaluator.evaluate_batch(boards))
+
+    def evaluate_leaf(self, board: Board):
+        # Static evaluation at the search horizon, extended through captures
+        # and promotions when a Quiescence is set.
+        if self.quiescence is None:
+            return self.evaluate(board)
+        return self.quiescence.evaluate(self, board)
+
+    def evaluate_leaves(self, boards: list) -> list:
+        if self.quiescence is None:
+            return self.evaluate_batch(boards)
+        return [self.quiescence.evaluate(self, board) for board in boards]
+
+    def advance(self, board: Board):
+        # Called by Game with every position actually reached, so searches that
+        # keep state between turns can re-root on it.
+        pass
 
     def get_moves_ranked(self, board: Board, get_max: bool = True) -> list:
         return []
     
 class NaiveMinMaxSearch(Search):
-    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000):
-        super().__init__(evaluator, depth, width)
+    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000, batch_size: int = 1,
+                 quiescence: Quiescence = None, tree: SearchTree = None):
+        super().__init__(evaluator, depth, width, None, batch_size, quiescence)
+        self.tree = tree
 
-    def get_moves_ranked(self, board: Board) -> list:
-        pieces = board.get_pieces(board.turn)
-        board_states = []
-        visited_fens = set()
+    def advance(self, board: Board):
+        if self.tree is not None:
+            self.tree.advance(board.hash)
 
-        for piece in pieces:
-            moves = piece.possible_moves(board)
-            for move in moves:
-                new_board = board.move(piece.rank, piece.file, move[0], move[1])
-                if new_board.is_legal() and new_board.get_fen() not in visited_fens:
-                    visited_fens.add(new_board.get_fen())
-                    eval_score = self.evaluator.evaluate(new_board)
-                    board_states.append((new_board, eval_score, piece.rank, piece.file, move[0], move[1]))
+    def score_child(self, board: Board, move: int) -> tuple:
+        if self.batch_size > 1:
+            # Scored later together with the rest of the ply's frontier.
+            return (None, move, board.copy())
+        eval_score = self.evaluate_leaf(board)
+        if self.tree is not None:
+            self.tree.store_score(board.hash, eval_score)
+        return (eval_score, move, None)
 
-        board_states.sort(key=lambda x: x[1], reverse=not board.turn)
-        board_states = board_states[:self.width]
+    def expand(self, board: Board, visited: set) -> list:
+        children = []
+        known = self.tree.get_children(board.hash) if self.tree is not None else None
+        if known is not None:
+            # Expanded by an earlier search: only children that were never
+            # scored need a board.
+            for move, child_hash in known:
+                if child_hash in visited:
+                    continue
+                visited.add(child_hash)
+                eval_score = self.tree.scores.get(child_hash)
+                if eval_score is not None:
+                    children.append((eval_score, move, None))
+                else:
+                    self.nodes += 1
+                    self.check_limits()
+                    board.make_move(*decode_move(move))
+                    try:
+                        children.append(self.score_child(board, move))
+                    finally:
+                        board.unmake_move()
+            return children
+
+        known = []
+        for move in board.legal_moves().tolist():
+            # A timeout must never leave a move made on the beam's boards.
+            self.check_limits()
+            board.make_move(*decode_move(move))
+            try:
+                known.append((move, board.hash))
+                if board.hash not in visited:
+                    visited.add(board.hash)
+                    self.nodes += 1
+                    children.append(self.score_child(board, move))
+            finally:
+                board.unmake_move()
+        if self.tree is not None:
+            self.tree.store_children(board.hash, known)
+        return children
+
+    def score_frontier(self, candidates: list) -> list:
+        pending = [i for i, candidate in enumerate(candidates) if candidate[0] is None]
+        for start in range(0, len(pending), self.batch_size):
+            self.check_limits()
+            chunk = pending[start:start + self.batch_size]
+            for i, eval_score in zip(chunk, self.evaluate_leaves([candidates[i][3] for i in chunk])):
+                candidates[i] = (eval_score,) + candidates[i][1:]
+                if self.tree is not None:
+                    self.tree.store_score(candidates[i][3].hash, eval_score)
+        return candidates
+
+    def select(self, candidates: list) -> list:
+        # Only the candidates that survive the width cut become boards for the
+        # next ply; the rest were scored in place.
+        return [(child if child is not None else parent.move(*decode_move(move)), eval_score, *root_move)
+                for eval_score, parent, move, child, root_move in candidates[:self.width]]
+
+    def get_moves_ranked(self, board: Board) -> list:
+        self.start_clock()
+        visited = set()
+        candidates = [(eval_score, board, move, child, decode_move(move))
+                      for eval_score, move, child in self.expand(board, visited)]
+        candidates = self.score_frontier(candidates)
+        candidates.sort(key=lambda x: x[0], reverse=not board.turn)
+        board_states = self.select(candidates)
 
         # Prioritize mate in 1
         if board_states and (1 if board_states[0][0].turn else -1) * board_states[0][1] == float('inf'):
             return [board_states[0]]
 
+        # Each ply ranks the root moves again, so running out of budget
+        # returns the last completed ply.
+        self.interruptible = True
         for _ in range(self.depth - 1):
             # check if checkmate here
-            new_board_states = []
-            for board, _, ri, fi, rf, ff in board_states:
-                pieces = board.get_pieces(board.turn)
-                for piece in pieces:
-                    moves = piece.possible_moves(board)
-                    for move in moves:
-                        new_board = board.move(piece.rank, piece.file, move[0], move[1])
-                        if new_board.is_legal() and new_board.get_fen() not in visited_fens:
-                            visited_fens.add(new_board.get_fen())
-                            new_eval = self.evaluator.evaluate(new_board)
-                            new_board_states.append((new_board, new_eval, ri, fi, rf, ff))
-            new_board_states.sort(key=lambda x: x[1], reverse=not board.turn)
-            if not new_board_states:
+            if not board_states:
+                break
+            turn = board_states[0][0].turn
+            candidates = []
+            try:
+                for parent, _, ri, fi, rf, ff in board_states:
+                    for new_eval, move, child in self.expand(parent, visited):
+                        candidates.append((new_eval, parent, move, child, (ri, fi, rf, ff)))
+                candidates = self.score_frontier(candidates)
+            except SearchTimeout:
                 break
-            board_states = new_board_states[:self.width]
+            candidates.sort(key=lambda x: x[0], reverse=not turn)
+            if not candidates:
+                break
+            board_states = self.select(candidates)
             if (1 if board_states[0][0].turn else -1) * board_states[0][1] == float('inf'):
                 return [board_states[0]]
 
         return board_states
     
 class DynamicMinMaxSearch(NaiveMinMaxSearch):
-    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000):
-        super().__init__(evaluator, depth, width)
+    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000, batch_size: int = 1,
+                 quiescence: Quiescence = None, tree: SearchTree = None):
+        super().__init__(evaluator, depth, width, batch_size, quiescence, tree)
         self.first_expand = False
         self.second_expand = False
         self.third_expand = False
@@ -81,4 +213,343 @@ class DynamicMinMaxSearch(NaiveMinMaxSearch):
             self.depth += 4
             self.width *= 2
             self.third_expand = True
-        return super().get_moves_ranked(board)
\ No newline at end of file
+        return super().get_moves_ranked(board)
+
+
+class AlphaBetaSearch(Search):
+    def __init__(self, evaluator: 'Evaluator', depth: int, width: int = 1000, table: TranspositionTable = None,
+                 batch_size: int = 1, quiescence: Quiescence = None, ordering: MoveOrdering = None):
+        super().__init__(evaluator, depth, width, table if table is not None else TranspositionTable(), batch_size,
+                         quiescence)
+        self.ordering = ordering if ordering is not None else MoveOrdering()
+        self.completed_depth = 0
+
+    def ordered_moves(self, board: Board, first: int = NO_MOVE, ply: int = 0) -> list:
+        return self.ordering.order(board, board.legal_moves().tolist(), ply, first)
+
+    def score_leaves(self, board: Board) -> dict:
+        # Above the horizon every legal child is scored in one batched call
+        # instead of one evaluator call per leaf.
+        moves, children = [], []
+        for move in self.ordered_moves(board):
+            board.make_move(*decode_move(move))
+            moves.append(move)
+            children.append(board.copy())
+            board.unmake_move()
+        scores = []
+        for start in range(0, len(children), self.batch_size):
+            scores.extend(self.evaluate_batch(children[start:start + self.batch_size]))
+        return dict(zip(moves, scores))
+
+    def negamax(self, board: Board, depth: int, alpha: float, beta: float, ply: int = 0) -> float:
+        self.nodes += 1
+        self.check_limits()
+        color = -1 if board.turn else 1
+        if depth <= 0:
+            if self.quiescence is not None:
+                return self.quiescence.search(self, board, alpha, beta)
+            return color * self.evaluate(board)
+
+        # Table scores and bounds are from player 0's side; flip them for player 1.
+        alpha_initial = alpha
+        entry = self.table.probe(board.hash)
+        hash_move = NO_MOVE
+        if entry is not None:
+            entry_depth, score, bound, hash_move = entry
+            if entry_depth >= depth:
+                score *= color
+                if color < 0 and bound != EXACT:
+                    bound = LOWER if bound == UPPER else UPPER
+                if bound == EXACT:
+                    return score
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                elif bound == UPPER:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        leaf_scores = self.score_leaves(board) if depth == 1 and self.batch_size > 1 and self.quiescence is None \
+            else None
+
+        best_score = -float('inf')
+        best_move = None
+        for move in self.ordered_moves(board, hash_move, ply):
+            if leaf_scores is not None:
+                self.nodes += 1
+                score = color * leaf_scores[move]
+            else:
+                board.make_move(*decode_move(move))
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+                board.unmake_move()
+            if best_move is None or score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.ordering.update(board, move, depth, ply)
+                break
+
+        if best_move is None:
+            return -float('inf') if board.is_checkmate() else 0
+
+        if best_score <= alpha_initial:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        if color < 0 and bound != EXACT:
+            bound = LOWER if bound == UPPER else UPPER
+        self.table.store(board.hash, depth, color * best_score, bound, best_move)
+        return best_score
+
+    def search_root(self, board: Board, depth: int, root_moves: list) -> list:
+        # Multi-PV root: alpha is the width-th best exact score so far, so the
+        # top width moves get exact scores. A move scoring <= alpha only has a
+        # fail-soft upper bound and cannot belong to the top width; it is
+        # sorted behind exact scores it ties with.
+        alpha, beta = -float('inf'), float('inf')
+        color = -1 if board.turn else 1
+        leaf_scores = self.score_leaves(board) if depth == 1 and self.batch_size > 1 and self.quiescence is None \
+            else None
+        scored = []
+        exact_scores = []
+        for move in root_moves:
+            if leaf_scores is not None:
+                self.nodes += 1
+                score = color * leaf_scores[move]
+            else:
+                board.make_move(*decode_move(move))
+                score = -self.negamax(board, depth - 1, -beta, -alpha, 1)
+                board.unmake_move()
+            exact = alpha == -float('inf') or score > alpha
+            scored.append((score, exact, move))
+            if exact:
+                exact_scores.append(score)
+                if len(exact_scores) >= self.width:
+                    exact_scores.sort(reverse=True)
+                    del exact_scores[self.width:]
+                    alpha = exact_scores[-1]
+        scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        best_score, _, best_move = scored[0]
+        self.table.store(board.hash, depth, color * best_score, EXACT, best_move)
+        return [(score, move) for score, _, move in scored]
+
+    def get_moves_ranked(self, board: Board) -> list:
+        self.table.new_search()
+        self.ordering.new_search()
+        self.start_clock()
+        self.completed_depth = 0
+
+        root_moves = self.ordered_moves(board)
+        if not root_moves:
+            return []
+
+        # Iterative deepening: each iteration searches the previous principal
+        # variation first, which tightens the window for the remaining moves.
+        # A timeout abandons the running iteration and keeps the last
+        # completed one; it may leave moves made, hence the copy.
+        root = board.copy()
+        scored = []
+        for depth in range(1, self.depth + 1):
+            try:
+                scored = self.search_root(root, depth, root_moves)
+            except SearchTimeout:
+                break
+            self.interruptible = True
+            root_moves = [move for _, move in scored]
+            self.completed_depth = depth
+            if scored[0][0] == float('inf'):
+                break
+
+        color = -1 if board.turn else 1
+        board_states = []
+        for score, move in scored[:self.width]:
+            move = decode_move(move)
+            board_states.append((board.move(*move), color * score, *move))
+        # Prioritize forced mates
+        if scored[0][0] == float('inf'):
+            return board_states[:1]
+        return board_states
+
+
+class MCTSNode():
+    __slots__ = ('move', 'children', 'visits', 'value', 'pending', 'terminal')
+
+    def __init__(self, move: int = NO_MOVE):
+        self.move = move
+        self.children = None
+        # value sums the results of the player who made move, in [-1, 1].
+        self.visits = 0
+        self.value = 0.0
+        self.pending = False
+        self.terminal = None
+
+
+class MCTSSearch(Search):
+    # PUCT over a tree of MCTSNodes. There is no policy head, so every move of
+    # a node gets the same prior. Leaves are evaluated batch_size at a time and
+    # virtual loss keeps the simulations of one batch (or of several threads)
+    # on different paths. Evaluator scores are divided by value_scale and
+    # clipped to [-1, 1]: 1 suits CNNEvaluator's tanh output, piece
+    # evaluators need a scale of several pawns. depth is unused.
+    def __init__(self, evaluator: 'Evaluator', depth: int = 0, width: int = 1000, table: TranspositionTable = None,
+                 batch_size: int = 16, simulations: int = 800, time_limit: float = None, c_puct: float = 1.5,
+                 virtual_loss: int = 1, threads: int = 1, value_scale: float = 1):
+        super().__init__(evaluator, depth, width, table, batch_size)
+        if simulations is None and time_limit is None:
+            raise ValueError("MCTSSearch needs a simulation count or a time limit")
+        self.simulations = simulations
+        # node_limit (see set_limits) also caps the simulations.
+        self.time_limit = time_limit
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.threads = threads
+        self.value_scale = value_scale
+        self.lock = threading.Lock()
+        self.root = None
+        self.root_board = None
+        self.simulations_run = 0
+
+    def leaf_value(self, score: float, turn: int) -> float:
+        # Evaluator score (player 0's point of view) to a value for the side to move.
+        if turn:
+            score = -score
+        if score == float('inf'):
+            return 1.0
+        if score == -float('inf'):
+            return -1.0
+        return max(-1.0, min(1.0, score / self.value_scale))
+
+    def select_child(self, node: MCTSNode) -> MCTSNode:
+        explore = self.c_puct * math.sqrt(max(node.visits, 1)) / len(node.children)
+        best, best_score = None, -float('inf')
+        for child in node.children:
+            q = child.value / child.visits if child.visits else 0.0
+            score = q + explore / (1 + child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def backup(self, path: list, value: float, virtual: int = 0):
+        # value is for the side to move at the leaf; each node keeps it for the
+        # player who moved into it.
+        for node in reversed(path):
+            value = -value
+            node.visits += 1 - virtual
+            node.value += value + virtual
+
+    def collect(self, board: Board, leaves: list) -> bool:
+        # One simulation from the root; False when it ran into a leaf that is
+        # already waiting for its evaluation.
+        node = self.root
+        path = [node]
+        while node.children:
+            node = self.select_child(node)
+            board.make_move(*decode_move(node.move))
+            path.append(node)
+
+        collected = True
+        if node.children is None and not node.pending:
+            moves = board.legal_moves().tolist()
+            if moves:
+                node.pending = True
+                for visited in path:
+                    visited.visits += self.virtual_loss
+                    visited.value -= self.virtual_loss
+                leaves.append((path, board.copy(), moves))
+            else:
+                node.children = []
+                node.terminal = -1.0 if board.is_checkmate() else 0.0
+        elif node.pending:
+            collected = False
+        if node.terminal is not None:
+            self.backup(path, node.terminal)
+
+        for _ in range(len(path) - 1):
+            board.unmake_move()
+        return collected
+
+    def budget_left(self, deadline: float = None) -> bool:
+        return ((self.simulations is None or self.simulations_run < self.simulations)
+                and (self.node_limit is None or self.simulations_run < self.node_limit)
+                and (deadline is None or time.perf_counter() < deadline))
+
+    def run_batch(self, board: Board):
+        leaves = []
+        with self.lock:
+            for _ in range(self.batch_size):
+                if (self.simulations is not None and self.simulations_run >= self.simulations) or \
+                        (self.node_limit is not None and self.simulations_run >= self.node_limit):
+                    break
+                if not self.collect(board, leaves):
+                    break
+                self.simulations_run += 1
+        if not leaves:
+            return
+        # Outside the lock, so other threads keep descending while the
+        # evaluator runs.
+        scores = self.evaluator.evaluate_batch([leaf_board for _, leaf_board, _ in leaves])
+        with self.lock:
+            for (path, leaf_board, moves), score in zip(leaves, scores):
+                node = path[-1]
+                node.children = [MCTSNode(move) for move in moves]
+                node.pending = False
+                self.backup(path, self.leaf_value(score, leaf_board.turn), self.virtual_loss)
+
+    def work(self, deadline: float = None):
+        board = self.root_board.copy()
+        # The root is always expanded so there is a move to return.
+        while self.budget_left(deadline) or self.root.children is None:
+            self.run_batch(board)
+
+    def advance(self, board: Board):
+        # Keep the subtree of the move actually played.
+        if self.root is None or board.hash == self.root_board.hash:
+            return
+        for child in self.root.children or ():
+            self.root_board.make_move(*decode_move(child.move))
+            key = self.root_board.hash
+            self.root_board.unmake_move()
+            if key == board.hash:
+                self.root = child
+                self.root_board = board.copy()
+                return
+        self.root = None
+
+    def get_moves_ranked(self, board: Board) -> list:
+        color = -1 if board.turn else 1
+        moves = board.legal_moves().tolist()
+        if not moves:
+            return []
+        # Prioritize mate in 1
+        for move in moves:
+            board.make_move(*decode_move(move))
+            checkmate = board.is_checkmate()
+            board.unmake_move()
+            if checkmate:
+                move = decode_move(move)
+                return [(board.move(*move), color * float('inf'), *move)]
+
+        if self.root is None or self.root_board.hash != board.hash:
+            self.root = MCTSNode()
+        self.root_board = board.copy()
+        self.simulations_run = 0
+        deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        if self.threads > 1:
+            workers = [threading.Thread(target=self.work, args=(deadline,)) for _ in range(self.threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            self.work(deadline)
+        self.nodes = self.simulations_run
+
+        children = sorted(self.root.children or (), key=lambda child: child.visits, reverse=True)
+        board_states = []
+        for child in children[:self.width]:
+            q = child.value / child.visits if child.visits else 0.0
+            move = decode_move(child.move)
+            board_states.append((board.move(*move), color * q * self.value_scale, *move))
+        return board_states
@@ -0,0 +1,67 @@
+class SearchTree():
+    # Positions expanded by earlier searches, keyed by board hash: the
+    # (move, child hash) list of each expanded node and the leaf score of each
+    # scored child. Scores belong to one evaluator, so only searches using the
+    # same evaluator may share a tree. advance() re-roots it on the move
+    # actually played and drops everything no longer reachable; at most
+    # max_nodes entries are kept between the two maps.
+    def __init__(self, max_nodes: int = 500000):
+        self.max_nodes = max_nodes
+        self.clear()
+
+    def clear(self):
+        self.children = {}
+        self.scores = {}
+        self.root = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.children) + len(self.scores)
+
+    def full(self) -> bool:
+        return len(self) >= self.max_nodes
+
+    def get_children(self, key: int):
+        children = self.children.get(key)
+        if children is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return children
+
+    def store_children(self, key: int, children: list):
+        if not self.full():
+            self.children[key] = children
+
+    def store_score(self, key: int, score: float):
+        if not self.full():
+            self.scores[key] = score
+
+    def advance(self, key: int):
+        # Keep the subtree below the new root and prune the rest.
+        if key == self.root:
+            return
+        self.root = key
+        reachable = {key}
+        frontier = [key]
+        while frontier:
+            children = self.children.get(frontier.pop())
+            if children is None:
+                continue
+            for _, child in children:
+                if child not in reachable:
+                    reachable.add(child)
+                    frontier.append(child)
+        self.children = {key: value for key, value in self.children.items() if key in reachable}
+        self.scores = {key: value for key, value in self.scores.items() if key in reachable}
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "nodes": len(self.children),
+            "scores": len(self.scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
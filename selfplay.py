@@ -0,0 +1,199 @@
+import time
+from multiprocessing import Pool, cpu_count
+from multiprocessing.util import Finalize
+
+import numpy as np
+import torch
+
+from cnn_evaluation import load_cnn
+from game import Game
+from inference import InferenceServer, InferenceConnection, RemoteEvaluator
+from search import NaiveMinMaxSearch, DynamicMinMaxSearch, AlphaBetaSearch, MCTSSearch
+from search_tree import SearchTree
+from storage import ShardWriter
+
+SEARCHES = {
+    'naive': NaiveMinMaxSearch,
+    'dynamic': DynamicMinMaxSearch,
+    'alphabeta': AlphaBetaSearch,
+    'mcts': MCTSSearch,
+}
+
+# Per-process state, filled once by init_worker so the model is loaded a single
+# time per worker instead of once per game. Searches are built per game: their
+# tables, trees and DynamicMinMaxSearch's depth bumps must not leak from one
+# game into the next.
+_worker = {}
+
+
+def init_worker(model_path: str = None, search: str = 'dynamic', depth: int = 2, width: int = 6,
+                p_range=(0.65, 0.95), stop_threshold: float = 1000, torch_threads: int = 1, model_seed: int = 0,
+                batch_size: int = 1, connection: InferenceConnection = None, tree_nodes: int = 500000):
+    # One intra-op thread per worker; the pool provides the parallelism.
+    torch.set_num_threads(torch_threads)
+    close_worker()
+    if connection is not None:
+        evaluator = RemoteEvaluator(connection)
+    else:
+        evaluator = load_cnn(model_path, model_seed)
+    _worker['evaluator'] = evaluator
+    _worker['search_cls'] = SEARCHES[search]
+    _worker['depth'] = depth
+    _worker['width'] = width
+    _worker['batch_size'] = batch_size
+    _worker['tree_nodes'] = tree_nodes
+    _worker['p_range'] = p_range
+    _worker['stop_threshold'] = stop_threshold
+
+
+def close_worker():
+    # Gives a RemoteEvaluator's client id back to the server.
+    evaluator = _worker.pop('evaluator', None)
+    if isinstance(evaluator, RemoteEvaluator):
+        evaluator.close()
+
+
+def make_search():
+    search_cls = _worker['search_cls']
+    args = (_worker['evaluator'], _worker['depth'], _worker['width'])
+    if _worker['tree_nodes'] and issubclass(search_cls, NaiveMinMaxSearch):
+        # The search plays both sides, so one tree serves the whole game.
+        return search_cls(*args, batch_size=_worker['batch_size'], tree=SearchTree(_worker['tree_nodes']))
+    return search_cls(*args, batch_size=_worker['batch_size'])
+
+
+def play_game(game_id: int, seed: int):
+    np.random.seed(seed)
+    search = make_search()
+    low, high = _worker['p_range']
+    start = time.perf_counter()
+    with torch.no_grad():
+        game = Game(search, search, low + np.random.random() * (high - low), stop_threshold=_worker['stop_threshold'])
+        game.board.turn = game_id % 2  # Alternate starting player
+        move_history, is_checkmate, eval = game.play()
+
+    val = -1 if eval < -game.stop_threshold else (1 if eval > game.stop_threshold else 0)
+    n = len(move_history)
+    codes = np.empty((n, 8, 8), dtype=np.int8)
+    halfmove = np.empty(n, dtype=np.int16)
+    for i, (board_codes, halfmove_clock) in enumerate(move_history.iter_codes()):
+        codes[i] = board_codes
+        halfmove[i] = halfmove_clock
+    values = (np.square(np.linspace(0, 1, n)) * val).astype(np.float32)[:, None]
+    return {
+        'game_id': game_id,
+        'seed': seed,
+        'codes': codes,
+        'halfmove': halfmove,
+        'values': values,
+        'result': val,
+        'checkmate': is_checkmate,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _init_from_settings(settings: dict):
+    init_worker(**settings)
+    # Runs when the worker exits normally (pool.close/join, maxtasksperchild).
+    Finalize(None, close_worker, exitpriority=10)
+
+
+def _play_task(task):
+    return play_game(*task)
+
+
+def iter_selfplay(num_games: int, num_workers: int = None, games_per_worker: int = None, seed: int = 0,
+                  first_game: int = 0, server: InferenceServer = None, **settings):
+    # Yields finished games in completion order; settings go to init_worker.
+    # With a started InferenceServer the workers share its model instead of
+    # loading their own; it needs one client per worker. games_per_worker
+    # recycles each worker after that many games (None keeps them for the whole
+    # run); games are handed out one at a time so each is yielded as it ends.
+    num_workers = num_workers or min(cpu_count(), num_games)
+    tasks = [(game_id, seed + game_id) for game_id in range(first_game, first_game + num_games)]
+    if server is not None:
+        if num_workers > server.num_clients:
+            raise ValueError("%d workers need an InferenceServer with at least as many clients, it has %d"
+                             % (num_workers, server.num_clients))
+        settings['connection'] = server.connection()
+    if num_workers <= 1:
+        init_worker(**settings)
+        try:
+            for task in tasks:
+                yield _play_task(task)
+        finally:
+            close_worker()
+        return
+    pool = Pool(num_workers, initializer=_init_from_settings, initargs=(settings,),
+                maxtasksperchild=games_per_worker)
+    finished = False
+    try:
+        for game in pool.imap_unordered(_play_task, tasks):
+            yield game
+        finished = True
+    finally:
+        # A clean shutdown lets every worker hand its client id back; workers
+        # killed after an error cannot.
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+
+def run_selfplay(num_games: int, output_dir: str, num_workers: int = None, games_per_worker: int = None,
+                 seed: int = 0, first_game: int = 0, verbose: bool = True, server: InferenceServer = None,
+                 **settings) -> int:
+    # Appends every position to the shards in output_dir as its game finishes.
+    positions = 0
+    start = time.perf_counter()
+    with ShardWriter(output_dir) as writer:
+        for count, game in enumerate(iter_selfplay(num_games, num_workers, games_per_worker, seed, first_game,
+                                                   server, **settings), start=1):
+            writer.write(game['codes'], game['halfmove'], game['values'])
+            writer.flush()
+            positions += len(game['codes'])
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print("Game %d completed: %d positions, result %d, %.1fs (%d/%d, %.2f games/s)" % (
+                    game['game_id'] + 1, len(game['codes']), game['result'], game['seconds'],
+                    count, num_games, count / elapsed))
+    if verbose:
+        print("%d games, %d positions in %.1fs" % (num_games, positions, time.perf_counter() - start))
+    return positions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parallel self-play data generation into position shards")
+    parser.add_argument("output_dir")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--games-per-worker", type=int, default=None,
+                        help="restart each worker after this many games (default: never)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-game", type=int, default=0)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--search", choices=sorted(SEARCHES), default="dynamic")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--stop-threshold", type=float, default=1000)
+    parser.add_argument("--batch-size", type=int, default=1, help="search frontier batch size")
+    parser.add_argument("--tree-nodes", type=int, default=500000, help="search tree kept between moves (0: off)")
+    parser.add_argument("--server", action="store_true", help="evaluate through a shared inference server")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    settings = dict(search=args.search, depth=args.depth, width=args.width, stop_threshold=args.stop_threshold,
+                    batch_size=args.batch_size, tree_nodes=args.tree_nodes)
+    num_workers = args.workers or min(cpu_count(), args.games)
+    if args.server:
+        with InferenceServer(args.model, num_workers, args.max_batch, args.max_latency) as server:
+            run_selfplay(args.games, args.output_dir, num_workers, args.games_per_worker, args.seed, args.first_game,
+                         server=server, **settings)
+            print(server.get_stats())
+    else:
+        run_selfplay(args.games, args.output_dir, num_workers, args.games_per_worker, args.seed, args.first_game,
+                     model_path=args.model, **settings)
@@ -0,0 +1,21 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+from evaluation import Evaluator, STOCKFISH_PATH
+
+from stockfish import Stockfish
+
+class StockfishEvaluator(Evaluator):
+    def __init__(self, elo=None, path: str = STOCKFISH_PATH, depth: int = 6) -> None:
+        super().__init__()
+        self.stockfish = Stockfish(path=path, depth=depth)
+        if elo:
+            self.stockfish.set_elo_rating(elo)
+        
+    def evaluate(self, board: 'Board') -> int:
+        self.stockfish.set_fen_position(board.get_fen())
+        eval = self.stockfish.get_evaluation()
+        if eval["type"] == "mate":
+            return float("inf") if eval["value"] > 0 else -float('inf')
+
+        return eval["value"]/100
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+from encoding import encode_codes
+
+# One self-play position: piece code per square (see encoding.PIECE_CODES),
+# halfmove clock and training target. 69 bytes instead of 1.5KB as a tensor.
+RECORD_DTYPE = np.dtype([('codes', np.int8, 64), ('halfmove', np.uint8), ('value', np.float32)])
+RECORDS_PER_SHARD = 1 << 20
+SHARD_PATTERN = "shard_%05d.bin"
+
+
+def list_shards(directory: str) -> list:
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith("shard_") and name.endswith(".bin"))
+    return [os.path.join(directory, name) for name in names]
+
+
+def open_shard(path: str):
+    # A crash can leave a partial record at the end of the last shard; it is ignored.
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+
+class ShardWriter():
+    # Appends records to fixed-size shards, resuming the last one if it is not full.
+    def __init__(self, directory: str, records_per_shard: int = RECORDS_PER_SHARD):
+        self.directory = directory
+        self.records_per_shard = records_per_shard
+        os.makedirs(directory, exist_ok=True)
+        shards = list_shards(directory)
+        self.shard_index = len(shards) - 1 if shards else 0
+        self.file = None
+        self.count = 0
+        self.written = 0
+        self._open(self.shard_index)
+
+    def _open(self, index: int):
+        if self.file is not None:
+            self.file.close()
+        path = os.path.join(self.directory, SHARD_PATTERN % index)
+        self.file = open(path, "ab")
+        self.count = self.file.tell() // RECORD_DTYPE.itemsize
+        # Drop a partial trailing record before appending.
+        self.file.truncate(self.count * RECORD_DTYPE.itemsize)
+        self.shard_index = index
+        if self.count >= self.records_per_shard:
+            self._open(index + 1)
+
+    def write(self, codes, halfmove, values):
+        codes = np.asarray(codes, dtype=np.int8).reshape(-1, 64)
+        records = np.empty(len(codes), dtype=RECORD_DTYPE)
+        records['codes'] = codes
+        records['halfmove'] = halfmove
+        records['value'] = np.asarray(values, dtype=np.float32).reshape(-1)
+        start = 0
+        while start < len(records):
+            n = min(len(records) - start, self.records_per_shard - self.count)
+            self.file.write(records[start:start + n].tobytes())
+            self.count += n
+            self.written += n
+            start += n
+            if self.count >= self.records_per_shard:
+                self._open(self.shard_index + 1)
+
+    def write_boards(self, boards, values):
+        codes = np.array([board.get_piece_codes() for board in boards], dtype=np.int8)
+        self.write(codes, [board.halfmove_clock for board in boards], values)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ShardReader():
+    # Memory-mapped view over every shard in a directory, indexed as one array.
+    def __init__(self, directory: str, stalemate_threshold: int = 20):
+        self.stalemate_threshold = stalemate_threshold
+        self.shards = [shard for shard in map(open_shard, list_shards(directory)) if len(shard)]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def records(self, indices) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        out = np.empty(len(indices), dtype=RECORD_DTYPE)
+        shard_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self.shards[shard_id][indices[mask] - self.offsets[shard_id]]
+        return out
+
+    def decode(self, indices):
+        records = self.records(indices)
+        states = encode_codes(records['codes'], records['halfmove'], self.stalemate_threshold)
+        return states, np.ascontiguousarray(records['value'])[:, None]
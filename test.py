@@ -3,60 +3,38 @@ from evaluation import *
 from search import *
 from game import *
 from train import *
-from multiprocessing import Pool, cpu_count
+from selfplay import run_selfplay
+from cache import EvalCache, CachedEvaluator
+from cnn_evaluation import load_cnn
+from parallel_search import ParallelSearch
+from multiprocessing import cpu_count
+import os
 
 
 SAVE_PATH = "E:\Courses\CS 686\Project\models\\test_model.pth"
+SELFPLAY_DIR = os.environ.get("SELFPLAY_DIR", r"E:\Courses\CS 686\Project\selfplay")
 
-model = CNNEvaluator()
-model.load_state_dict(torch.load(SAVE_PATH))
-model.eval()
+_model = None
 
-def simulate_game(game_id, model, depth, width, stop_threshold=1000):
-    # Setup evaluator and search
-    mms = DynamicMinMaxSearch(model, depth, width)
-    states = []
-    values = []
-
-    with torch.no_grad():
-        # Create a game instance
-        game = Game(mms, mms, 0.65+np.random.random()*0.3, stop_threshold=stop_threshold)
-        game.board.turn = game_id % 2  # Alternate starting player
-
-        # Play the game
-        move_history, is_checkmate, eval = game.play()
-
-        # Assign value based on evaluation
-        val = -1 if eval < -game.stop_threshold else (1 if eval > game.stop_threshold else 0)
-
-        # Collect the last 10 moves
-        n = len(move_history)
-        weights = np.square(np.linspace(0, 1, n))
-        for board, weight in zip(move_history, weights):
-            states.append(board.get_board_tensor())
-            values.append(np.array([weight]))
-
-        return states, values, game_id
-
-def run_simulation(game_id):
-    return simulate_game(game_id, model, 2, 6, 32)
+def load_model():
+    # Loaded on first use so importing this module (e.g. in spawned pool
+    # workers) does not read the checkpoint.
+    global _model
+    if _model is None:
+        _model = load_cnn(SAVE_PATH)
+    return _model
 
 def run_training(multithread=False):
+    model = load_model()
     states = []
     values = []
 
     if multithread:
-        num_games = 2
-        num_workers = min(cpu_count(), num_games)
-        
-        with Pool(num_workers) as pool:
-            results = pool.map(run_simulation, range(num_games))
-
-        
-        for s, v, game_id in results:
-            states.extend(s)
-            values.extend(v)
-            print(f"Game {game_id + 1} completed.")
+        num_games = 20
+        run_selfplay(num_games, SELFPLAY_DIR, num_workers=min(cpu_count(), num_games),
+                     model_path=SAVE_PATH, depth=2, width=6, stop_threshold=1000)
+        # Trains on every position stored so far, not just this run's games.
+        train_loader = make_shard_loader(SELFPLAY_DIR, batch_size=8)
     else:
         mms = DynamicMinMaxSearch(model, 2, width=6)
         with torch.no_grad():
@@ -67,8 +45,8 @@ def run_training(multithread=False):
                 val = -1 if eval < -game.stop_threshold else (1 if eval > game.stop_threshold else 0)
                 n = len(move_history)
                 weights = np.square(np.linspace(0, 1, n))
-                for board, weight in zip(move_history, weights):
-                    states.append(board.get_board_tensor())
+                for tensor, weight in zip(move_history.iter_tensors(), weights):
+                    states.append(tensor)
                     values.append(np.array([weight*val]))
                 print("Game", i+1)
                 print(move_history[-1])
@@ -77,18 +55,20 @@ def run_training(multithread=False):
                 print(is_checkmate)
                 print()
 
-    print(len(states))
-    print(len(values))
-    dataset = ChessDataset(states, values)
-    train_loader = DataLoader(dataset, batch_size=8, shuffle=True)
+        print(len(states))
+        print(len(values))
+        dataset = ChessDataset(states, values)
+        train_loader = DataLoader(dataset, batch_size=8, shuffle=True)
     trainer = Trainer(model)
     trainer.train_model(train_loader, epochs=100, save_path = SAVE_PATH)
 
 def run_testing():
     #np.random.seed(seed=123)
+    model = load_model()
 
-    mms0 = DynamicMinMaxSearch(model, 2, width=6)
-    mms1 = DynamicMinMaxSearch(PiecePositionEvaluator(), 2, width=6)
+    cache = EvalCache()
+    mms0 = DynamicMinMaxSearch(CachedEvaluator(model, cache), 2, width=6)
+    mms1 = DynamicMinMaxSearch(CachedEvaluator(PiecePositionEvaluator(), cache), 2, width=6)
     game = Game(mms0, mms1, p=1, stop_threshold=1000)
     game.board = Board(placement=None)
     print("Initial eval: ", model.evaluate(game.board))
@@ -98,6 +78,7 @@ def run_testing():
     
     last_state = history[-1]
     print(last_state.is_checkmate())
+    print(cache.get_stats())
 
 def run_debugging():
     placement = {
@@ -116,13 +97,16 @@ def run_debugging():
     print(bd.is_checkmate())
 
 def compare_against_stockfish(elo=1000):
-    stockfish = Stockfish(path="E:\Courses\CS 686\Project\stockfish\stockfish-windows-x86-64-avx2")
+    from stockfish import Stockfish
+
+    model = load_model()
+    stockfish = Stockfish(path=STOCKFISH_PATH)
     stockfish.update_engine_parameters({
         "UCI_LimitStrength": True,
         "UCI_Elo": 100
     })
     stockfish.set_depth(1)
-    stockfish2 = Stockfish(path="E:\Courses\CS 686\Project\stockfish\stockfish-windows-x86-64-avx2")
+    stockfish2 = Stockfish(path=STOCKFISH_PATH)
     stockfish2.update_engine_parameters({
         "UCI_LimitStrength": True,
         "UCI_Elo": 4000
@@ -167,9 +151,40 @@ def compare_against_stockfish(elo=1000):
         
         
 
+def run_interactive(depth=4, human=0):
+    # Play against the engine from the console; moves are typed as e2e4.
+    model = load_model()
+    board = Board()
+    print(board)
+    with ParallelSearch(model, depth, search_cls=AlphaBetaSearch, workers=cpu_count()) as search:
+        while len(board.legal_moves()) and not board.is_checkmate():
+            if board.turn == human:
+                move = input("Your move: ").strip()
+                try:
+                    ri = int(move[1])-1
+                    fi = ord(move[0])-ord('a')
+                    rf = int(move[3])-1
+                    ff = ord(move[2])-ord('a')
+                except (IndexError, ValueError):
+                    print("Moves look like e2e4")
+                    continue
+                legal = board.legal_moves().tolist()
+                if encode_move(ri, fi, rf, ff) not in legal and encode_move(ri, fi, rf, ff, True) not in legal:
+                    print("Illegal move")
+                    continue
+            else:
+                _, score, ri, fi, rf, ff = search.get_moves_ranked(board)[0]
+                print("Engine:", chr(ord('a')+fi)+str(ri+1)+chr(ord('a')+ff)+str(rf+1), score)
+                print(search.get_stats())
+            board = board.move(ri, fi, rf, ff)
+            print()
+            print(board)
+    print("Checkmate" if board.is_checkmate() else "Draw")
+
 if __name__ == "__main__":
     run_training()
     #run_testing()
     #run_debugging()
     #print(cpu_count())
-    #compare_against_stockfish(elo=200)
\ No newline at end of file
+    #compare_against_stockfish(elo=200)
+    #run_interactive()
\ No newline at end of file
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitboard import BitBoard
+from board import Board, parse_fen
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+
+
+def test_parse_fen_start_position():
+    codes, turn, halfmove_clock, fullmove_number = parse_fen(START)
+    assert codes[0].tolist() == [4, 2, 3, 5, 6, 3, 2, 4]
+    assert codes[7].tolist() == [-4, -2, -3, -5, -6, -3, -2, -4]
+    assert (turn, halfmove_clock, fullmove_number) == (0, 0, 1)
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitBoard])
+def test_unknown_piece_raises_value_error(board_cls):
+    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w - - 0 1"
+    with pytest.raises(ValueError) as error:
+        board_cls.from_fen(fen)
+    assert "'X'" in str(error.value)
+    assert fen in str(error.value)
+
+
+@pytest.mark.parametrize("fen", [
+    "",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w - - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN w - - 0 1",
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+])
+def test_malformed_fen_raises_value_error(fen):
+    with pytest.raises(ValueError):
+        parse_fen(fen)
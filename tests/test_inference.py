@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference
+from inference import InferenceServer, RemoteEvaluator
+from selfplay import iter_selfplay
+
+SETTINGS = dict(search='naive', depth=1, width=2, stop_threshold=1000)
+
+
+def test_remote_evaluator_close_returns_client_id(monkeypatch):
+    monkeypatch.setattr(inference, 'CONNECT_TIMEOUT', 1)
+    with InferenceServer(None, 1) as server:
+        RemoteEvaluator(server.connection()).close()
+        RemoteEvaluator(server.connection()).close()
+
+
+def test_two_selfplay_batches_on_one_server(monkeypatch):
+    monkeypatch.setattr(inference, 'CONNECT_TIMEOUT', 5)
+    with InferenceServer(None, 2) as server:
+        for num_workers in (1, 2, 2, 1):
+            games = list(iter_selfplay(2, num_workers, server=server, **SETTINGS))
+            assert len(games) == 2
+
+
+def test_recycled_workers_return_client_ids(monkeypatch):
+    monkeypatch.setattr(inference, 'CONNECT_TIMEOUT', 5)
+    with InferenceServer(None, 2) as server:
+        games = list(iter_selfplay(4, 2, games_per_worker=1, server=server, **SETTINGS))
+        assert sorted(game['game_id'] for game in games) == [0, 1, 2, 3]
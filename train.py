@@ -1,7 +1,9 @@
 import torch
 import torch.nn as nn
 
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+from storage import ShardReader
 
 class ChessDataset(Dataset):
     def __init__(self, board_states, target_values):
@@ -14,6 +16,25 @@ class ChessDataset(Dataset):
     def __getitem__(self, idx):
         return torch.tensor(self.board_states[idx], dtype=torch.float32), torch.tensor(self.target_values[idx], dtype=torch.float32)
 
+class ShardDataset(Dataset):
+    # Indexed with a list of positions so whole batches are gathered from the
+    # memory-mapped shards and encoded in one call; use make_shard_loader.
+    def __init__(self, directory, stalemate_threshold=20):
+        self.reader = ShardReader(directory, stalemate_threshold)
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, indices):
+        states, values = self.reader.decode(indices)
+        return torch.from_numpy(states), torch.from_numpy(values)
+
+def make_shard_loader(directory, batch_size=256, shuffle=True, num_workers=0):
+    dataset = ShardDataset(directory)
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                      batch_size=None, num_workers=num_workers)
+
 class Trainer:
     def __init__(self, model):
         self.model = model
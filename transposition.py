@@ -0,0 +1,119 @@
+import numpy as np
+
+EMPTY, EXACT, LOWER, UPPER = range(4)
+NO_MOVE = 0
+
+# keys (8) + score (8) + depth (1) + bound (1) + move (2) + age (1)
+ENTRY_BYTES = 21
+
+POLICIES = ("depth", "always")
+
+
+class TranspositionTable():
+    # Scores are stored from player 0's point of view, the same convention the
+    # evaluators use. They are search results on one evaluator's scale, so only
+    # searches using the same evaluator may share a table.
+    def __init__(self, size_mb: float = 16, bucket_size: int = 2, policy: str = "depth"):
+        if policy not in POLICIES:
+            raise ValueError("Unknown replacement policy %r" % policy)
+        self.policy = policy
+        self.bucket_size = bucket_size
+        self.num_buckets = max(1, int(size_mb * 2**20) // (ENTRY_BYTES * bucket_size))
+        shape = (self.num_buckets, bucket_size)
+        self.keys = np.zeros(shape, dtype=np.uint64)
+        self.scores = np.zeros(shape, dtype=np.float64)
+        self.depths = np.zeros(shape, dtype=np.int8)
+        self.bounds = np.zeros(shape, dtype=np.uint8)
+        self.moves = np.zeros(shape, dtype=np.uint16)
+        self.ages = np.zeros(shape, dtype=np.uint8)
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def clear(self):
+        self.bounds.fill(EMPTY)
+        self.generation = 0
+        self.reset_stats()
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def _find(self, key: int):
+        bucket = key % self.num_buckets
+        keys = self.keys[bucket]
+        bounds = self.bounds[bucket]
+        for slot in range(self.bucket_size):
+            if bounds[slot] != EMPTY and int(keys[slot]) == key:
+                return bucket, slot
+        return bucket, None
+
+    def probe(self, key: int):
+        bucket, slot = self._find(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.ages[bucket, slot] = self.generation
+        return (int(self.depths[bucket, slot]), float(self.scores[bucket, slot]),
+                int(self.bounds[bucket, slot]), int(self.moves[bucket, slot]))
+
+    def get_move(self, key: int) -> int:
+        bucket, slot = self._find(key)
+        return NO_MOVE if slot is None else int(self.moves[bucket, slot])
+
+    def _victim(self, bucket: int, depth: int):
+        bounds = self.bounds[bucket]
+        for slot in range(self.bucket_size):
+            if bounds[slot] == EMPTY:
+                return slot
+        # Entries left over from earlier searches go first, then the shallowest.
+        ages = self.ages[bucket]
+        stale = [slot for slot in range(self.bucket_size) if ages[slot] != self.generation]
+        candidates = stale or range(self.bucket_size)
+        if self.policy == "always":
+            return candidates[-1]
+        victim = min(candidates, key=lambda slot: self.depths[bucket, slot])
+        if not stale and self.depths[bucket, victim] > depth:
+            return None
+        return victim
+
+    def store(self, key: int, depth: int, score: float, bound: int = EXACT, move: int = NO_MOVE):
+        bucket, slot = self._find(key)
+        if slot is not None:
+            if (self.policy == "depth" and self.depths[bucket, slot] > depth
+                    and self.ages[bucket, slot] == self.generation):
+                return
+            if move == NO_MOVE:
+                move = int(self.moves[bucket, slot])
+        else:
+            slot = self._victim(bucket, depth)
+            if slot is None:
+                return
+            if self.bounds[bucket, slot] != EMPTY:
+                self.collisions += 1
+        self.keys[bucket, slot] = key
+        self.scores[bucket, slot] = score
+        self.depths[bucket, slot] = min(depth, 127)
+        self.bounds[bucket, slot] = bound
+        self.moves[bucket, slot] = move
+        self.ages[bucket, slot] = self.generation
+        self.stores += 1
+
+    def usage(self) -> float:
+        return float(np.count_nonzero(self.bounds)) / self.bounds.size
+
+    def get_stats(self) -> dict:
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "usage": self.usage(),
+        }
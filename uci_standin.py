@@ -0,0 +1,66 @@
+# Minimal UCI engine for testing EnginePool without Stockfish installed. Scores
+# positions by material only and plays the first capture, else the first legal
+# move, under this repo's variant rules.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from board import Board, decode_move
+
+VALUES = {0: 0, 1: 100, 2: 300, 3: 300, 4: 500, 5: 900, 6: 0}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+
+
+def uci_move(board: Board, move: int) -> str:
+    rank_initial, file_initial, rank_final, file_final = decode_move(move)
+    name = "%s%d%s%d" % (chr(ord('a') + file_initial), rank_initial + 1, chr(ord('a') + file_final), rank_final + 1)
+    piece = board.grid[rank_initial, file_initial]
+    if piece.name in "Pp" and rank_final in (0, 7):
+        name += "q"
+    return name
+
+
+def search(board: Board):
+    moves = board.legal_moves()
+    if len(moves) == 0:
+        return ("mate", 0) if board.in_check() else ("cp", 0), None
+    material = sum(VALUES[abs(code)] * (1 if code > 0 else -1) for code in board.get_piece_codes().ravel().tolist())
+    best = moves[0]
+    for move in moves:
+        _, _, rank_final, file_final = decode_move(move)
+        if board.grid[rank_final, file_final] is not None:
+            best = move
+            break
+    return ("cp", material if board.turn == 0 else -material), uci_move(board, best)
+
+
+def main():
+    board = Board.from_fen(START_FEN)
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "uci":
+            print("id name uci-standin")
+            print("uciok")
+        elif command == "isready":
+            print("readyok")
+        elif command == "position":
+            if len(tokens) > 1 and tokens[1] == "fen":
+                end = tokens.index("moves") if "moves" in tokens else len(tokens)
+                board = Board.from_fen(" ".join(tokens[2:end]))
+            else:
+                board = Board.from_fen(START_FEN)
+        elif command == "go":
+            (score_type, value), best = search(board)
+            print("info depth 1 score %s %d" % (score_type, value))
+            print("bestmove %s" % (best or "(none)"))
+        elif command == "quit":
+            break
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import random
+
+PIECE_NAMES = "PNBRQKpnbrqk"
+HALFMOVE_KEYS = 256
+
+_rng = random.Random(0x5EED)
+
+ZOBRIST_PIECES = {name: [_rng.getrandbits(64) for _ in range(64)] for name in PIECE_NAMES}
+ZOBRIST_TURN = _rng.getrandbits(64)
+# The halfmove clock is part of the key because it changes both legality
+# (the stalemate threshold) and the evaluation of otherwise equal positions.
+ZOBRIST_HALFMOVE = [_rng.getrandbits(64) for _ in range(HALFMOVE_KEYS)]
+
+
+def piece_key(name: str, rank: int, file: int) -> int:
+    return ZOBRIST_PIECES[name][rank * 8 + file]
+
+
+def halfmove_key(halfmove_clock: int) -> int:
+    return ZOBRIST_HALFMOVE[halfmove_clock % HALFMOVE_KEYS]